@@ -0,0 +1,49 @@
+"""
+Local stand-in for KEDA: sizes the worker Deployment from the data_chunks backlog.
+
+Run it next to the cluster while the pipeline is running, with the management UI forwarded:
+    kubectl port-forward deployment/rabbitmq 15672:15672
+    PYTHONPATH=.. python autoscaler.py
+"""
+import os
+import subprocess
+import time
+
+from hzz.autoscale import from_env, queue_stats
+from hzz.backends.rabbitmq import QUEUE_NAME
+
+MANAGEMENT_URL = os.getenv("RABBITMQ_MANAGEMENT_URL", "http://localhost:15672")
+USER = os.getenv("RABBITMQ_USER", "user")
+PASSWORD = os.getenv("RABBITMQ_PASSWORD", "password")
+DEPLOYMENT = os.getenv("AUTOSCALE_DEPLOYMENT", "worker")
+INTERVAL = float(os.getenv("AUTOSCALE_INTERVAL", "15"))  # seconds between decisions
+
+
+def current_replicas():
+    output = subprocess.run(["kubectl", "get", "deployment", DEPLOYMENT, "-o", "jsonpath={.spec.replicas}"],
+                            check=True, capture_output=True, text=True).stdout
+    return int(output or 0)
+
+
+def scale(replicas):
+    subprocess.run(["kubectl", "scale", f"deployment/{DEPLOYMENT}", f"--replicas={replicas}"], check=True)
+
+
+if __name__ == "__main__":
+    autoscaler = from_env()
+
+    while True:
+        try:
+            depth, consumers, ack_rate = queue_stats(MANAGEMENT_URL, QUEUE_NAME, USER, PASSWORD)
+            replicas = current_replicas()
+            per_worker_rate = ack_rate / consumers if consumers else None
+
+            desired = autoscaler.desired_replicas(time.time(), depth, per_worker_rate, replicas)
+            print(f"backlog={depth} consumers={consumers} ack_rate={ack_rate:.2f}/s replicas={replicas} -> {desired}")
+
+            if desired != replicas:
+                scale(desired)
+        except Exception as e:
+            print(f"Autoscaler check failed: {e}")
+
+        time.sleep(INTERVAL)
@@ -1,8 +1,9 @@
 
 
-docker build -t loader-image:latest -f dockerfile.loader .
-docker build -t worker-image:latest -f dockerfile.worker .
-docker build -t aggregator-image:latest -f dockerfile.aggregator .
+# images are built from the repository root so they include the shared hzz package
+docker build -t loader-image:latest -f dockerfile.loader ..
+docker build -t worker-image:latest -f dockerfile.worker ..
+docker build -t aggregator-image:latest -f dockerfile.aggregator ..
 
 # kubectl apply -f persistent-volume.yaml
 
@@ -12,4 +13,9 @@ kubectl apply -f loader-job.yaml
 kubectl apply -f worker-deployment.yaml
 kubectl apply -f aggregator-job.yaml
 
+# Size the worker pool from the queue backlog: with KEDA installed use
+# kubectl apply -f worker-scaledobject.yaml
+# otherwise run the local controller alongside the port-forward below
+# PYTHONPATH=.. python autoscaler.py &
+
 kubectl port-forward deployment/rabbitmq 15672:15672
\ No newline at end of file
@@ -1,79 +1,53 @@
 import os
 import shutil
 import awkward as ak
-import pandas
-from workerfunctions import *
 import time
+import socket
+
+from hzz import metrics
+from hzz.analysis import PLAN
+from hzz.backends.volume import chunk_val, claim_chunk, write_histograms
+from hzz.selection import process_chunk
 
 INPUT_DIR = "data/chunks"
 PROCESSING_DIR = "data/processing"
 OUTPUT_DIR = "data/processed"
 DONE_FILE = "/data/loader_done"
+WORKERS_DONE_DIR = "/data/workers_done"
 
-variables = ['lep_pt','lep_eta','lep_phi','lep_E','lep_charge','lep_type']
-weight_variables = ["mcWeight", "scaleFactor_PILEUP", "scaleFactor_ELE", "scaleFactor_MUON", "scaleFactor_LepTRIGGER"]
+# Each replica gets its own completion marker so scaled-out workers don't overwrite each other
+WORKER_ID = os.getenv("HOSTNAME", socket.gethostname())
 
 os.makedirs(PROCESSING_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def process_chunk(chunk_path, output_path):
-    """
-    Process a single chunk: Apply filters, calculate invariant mass, and save results.
-    """
-    print(f"Processing {chunk_path}...")
-    data = ak.from_parquet(chunk_path)
-    
-    # Number of events in this batch
-    nIn = len(data)
-    directory = chunk_path.split('-')[0]
-    val = directory.split('/')[2]
-    print(val)
- 
-    # Apply filters and calculations
-    # Record transverse momenta 
-    data['leading_lep_pt'] = data['lep_pt'][:,0]
-    data['sub_leading_lep_pt'] = data['lep_pt'][:,1]
-    data['third_leading_lep_pt'] = data['lep_pt'][:,2]
-    data['last_lep_pt'] = data['lep_pt'][:,3]
-    
-    # Cuts
-    lep_type = data['lep_type']
-    data = data[~cut_lep_type(lep_type)]
-    lep_charge = data['lep_charge']
-    data = data[~cut_lep_charge(lep_charge)]
-    
-    # Invariant Mass
-    data['mass'] = calc_mass(data['lep_pt'], data['lep_eta'], data['lep_phi'], data['lep_E'])
-
-    # Store Monte Carlo weights in the data
-    if 'data' not in val: # Only calculates weights if the data is MC
-        data['totalWeight'] = calc_weight(weight_variables, val, data)
-        nOut = sum(data['totalWeight']) # sum of weights passing cuts in this batch 
-    else:
-        nOut = len(data)
-        
-    print("\t\t nIn: "+str(nIn)+",\t nOut: \t"+str(nOut)) # events before and after
-
-    ak.to_parquet(data, output_path)
-    print(f"Processed data saved to {output_path}")
-
 if __name__ == "__main__":
     while True:
-        # Find the first available chunk to process
-        chunk_files = [f for f in os.listdir(INPUT_DIR) if f.endswith(".awkd")]
-        if chunk_files:
-
-            # Lock the file by moving it to the processing directory
-            chunk_file = chunk_files[0]
+        # Lock the first available chunk by moving it to the processing directory
+        chunk_file = claim_chunk(INPUT_DIR, PROCESSING_DIR)
+        if chunk_file:
             chunk_path = os.path.join(INPUT_DIR, chunk_file)
             processing_path = os.path.join(PROCESSING_DIR, chunk_file)
 
-            shutil.move(chunk_path, processing_path)
-
             try:
+                chunk_metrics = metrics.chunk('volume-worker', chunk=chunk_file)
+
                 # Process the chunk
+                print(f"Processing {processing_path}...")
+                with chunk_metrics.stage('decode'):
+                    data = ak.from_parquet(processing_path)
+                chunk_metrics.count(bytes_in=os.path.getsize(processing_path))
+                data = process_chunk(data, chunk_val(chunk_file), chunk_metrics)
+                # Every histogram is filled here, so the outputter only has to add up the sums
+                histograms = PLAN.fill(data, chunk_metrics=chunk_metrics)
+
+                # Write to a temp file first so the outputter never sees a partial result
                 output_path = os.path.join(OUTPUT_DIR, f"processed-{chunk_file}")
-                process_chunk(processing_path, output_path)
+                with chunk_metrics.stage('encode'):
+                    write_histograms(histograms, output_path)
+                print(f"Filled histograms saved to {output_path}")
+                chunk_metrics.count(bytes_out=os.path.getsize(output_path))
+                chunk_metrics.emit()
 
                 # Mark as completed by deleting or archiving
                 os.remove(processing_path)
@@ -90,9 +64,9 @@ if __name__ == "__main__":
                 print("No chunks available. Waiting for new chunks...")
                 time.sleep(2)  # Wait before checking again
     
-    # After processing all chunks, create a "workers_done" file
-   
-    workers_done_path = "/data/workers_done"
+    # After processing all chunks, create this worker's completion marker
+    os.makedirs(WORKERS_DONE_DIR, exist_ok=True)
+    workers_done_path = os.path.join(WORKERS_DONE_DIR, WORKER_ID)
     with open(workers_done_path, "w") as f:
         f.write("done")
     print(f"Worker signaling completion with {workers_done_path}.")
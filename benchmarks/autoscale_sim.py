@@ -0,0 +1,121 @@
+"""
+Replay a synthetic data_chunks backlog through hzz.autoscale.Autoscaler and
+compare it with fixed-size worker pools.
+
+The loader publishes in bursts (one per sample, data first) with idle gaps, workers take
+`startup` seconds to become ready, and the controller decides every `interval`
+seconds, like Kubernetes/autoscaler.py. Exits non-zero if the autoscaled pool
+leaves its min/max bounds or fails to drain the backlog.
+
+    python -m benchmarks.autoscale_sim
+"""
+import argparse
+import sys
+
+from hzz.autoscale import Autoscaler
+
+
+# (start, stop, chunks/s) of each sample's burst: data, the large Z/ttbar backgrounds, ZZ, signal
+BURSTS = [(0, 120, 2.0), (400, 520, 4.0), (1000, 1100, 0.5), (1400, 1430, 1.0)]
+
+
+def backlog_curve(t):
+    """
+    Chunks published per second at time t.
+    """
+    return sum(rate for start, stop, rate in BURSTS if start <= t < stop)
+
+
+def simulate(autoscaler=None, fixed_replicas=1, worker_rate=0.2, startup=30, interval=15, dt=1, max_time=7200):
+    """
+    Step the queue and worker pool. Returns a dict of makespan, replica-seconds, peak backlog and replica bounds.
+    """
+    backlog = 0.0
+    published = 0.0
+    processed = 0.0
+    replicas = autoscaler.min_replicas if autoscaler else fixed_replicas
+    pending = []  # ready times of pods that are starting
+    ready = replicas
+    replica_seconds = 0.0
+    peak_backlog = 0.0
+    seen_replicas = {replicas}
+
+    t = 0
+    while t < max_time:
+        arrivals = backlog_curve(t) * dt
+        backlog += arrivals
+        published += arrivals
+
+        # Pods finish starting up
+        ready += sum(1 for ready_at in pending if ready_at <= t)
+        pending = [ready_at for ready_at in pending if ready_at > t]
+
+        done = min(backlog, ready * worker_rate * dt)
+        backlog -= done
+        processed += done
+        replica_seconds += replicas * dt
+        peak_backlog = max(peak_backlog, backlog)
+
+        if autoscaler and t % interval == 0:
+            # Measured throughput per ready worker, as the controller would read it from the ack rate
+            desired = autoscaler.desired_replicas(t, backlog, worker_rate if ready else None, replicas)
+            if desired > replicas:
+                pending.extend([t + startup] * (desired - replicas))
+            elif desired < replicas:
+                # Scale-down removes starting pods first, then ready ones
+                remove = replicas - desired
+                dropped = min(remove, len(pending))
+                pending = pending[:len(pending) - dropped]
+                ready -= remove - dropped
+            replicas = desired
+            seen_replicas.add(replicas)
+
+        t += dt
+        if t > BURSTS[-1][1] and backlog < 1e-9 and not pending:
+            break
+
+    return {
+        'makespan': t,
+        'replica_seconds': replica_seconds,
+        'peak_backlog': peak_backlog,
+        'drained': backlog < 1e-9,
+        'min_replicas': min(seen_replicas),
+        'max_replicas': max(seen_replicas),
+        'processed': processed,
+        'published': published,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the worker autoscaler against a synthetic backlog.")
+    parser.add_argument("--min-replicas", type=int, default=1)
+    parser.add_argument("--max-replicas", type=int, default=10)
+    parser.add_argument("--target-drain-seconds", type=float, default=60)
+    parser.add_argument("--worker-rate", type=float, default=0.2, help="chunks/s one worker processes")
+    args = parser.parse_args()
+
+    autoscaler = Autoscaler(args.min_replicas, args.max_replicas, args.target_drain_seconds,
+                            scale_down_window=120, default_rate=args.worker_rate)
+
+    runs = {
+        f'fixed {args.min_replicas}': simulate(fixed_replicas=args.min_replicas, worker_rate=args.worker_rate),
+        f'fixed {args.max_replicas}': simulate(fixed_replicas=args.max_replicas, worker_rate=args.worker_rate),
+        'autoscaled': simulate(autoscaler, worker_rate=args.worker_rate),
+    }
+
+    print(f"{'pool':<14}{'makespan s':>12}{'replica-s':>12}{'peak backlog':>14}{'replicas':>10}")
+    for name, result in runs.items():
+        print(f"{name:<14}{result['makespan']:>12}{result['replica_seconds']:>12.0f}{result['peak_backlog']:>14.0f}"
+              f"{result['min_replicas']:>5}-{result['max_replicas']:<4}")
+
+    result = runs['autoscaled']
+    ok = (result['drained']
+          and args.min_replicas <= result['min_replicas'] <= result['max_replicas'] <= args.max_replicas
+          and result['makespan'] < runs[f'fixed {args.min_replicas}']['makespan']
+          and result['replica_seconds'] < runs[f'fixed {args.max_replicas}']['replica_seconds'])
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
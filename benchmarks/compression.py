@@ -0,0 +1,111 @@
+"""
+Measure the CPU vs. broker bandwidth trade-off of compressing message bodies.
+
+Builds the chunk messages the loader publishes and the result messages the
+workers publish from local ROOT files (see benchmarks/generate.py). Then,
+for each codec and level, it reports the compression ratio, compress and
+decompress throughput, and the broker bandwidth below which compressing
+saves time end to end.
+
+    python -m benchmarks.compression --data-path fixtures/ --bandwidth 100
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from hzz import serialization
+from hzz.analysis import PLAN
+from hzz.constants import DATA_PATH, samples
+from hzz.loader import iterate_chunks
+from hzz.selection import process_chunk
+
+# (encoding, level) pairs to compare; level None is the codec's default
+CODECS = [('identity', None), ('lz4', 0), ('lz4', 4), ('lz4', 9),
+          ('zstd', 1), ('zstd', 3), ('zstd', 9), ('zstd', 19)]
+
+
+def message_bodies(data_path, step_size):
+    """
+    Serialized loader (chunk) and worker (result) message bodies for every chunk of every sample.
+    """
+    chunks, results = [], []
+    for sample in samples:
+        for val, idx, path, entry_start, entry_stop, data in iterate_chunks(sample, step_size, data_path):
+            message = {'sample': sample, 'val': val, 'idx': idx, 'path': path,
+                       'entry_start': entry_start, 'entry_stop': entry_stop, 'data': data}
+            chunks.append(serialization.dumps(message))
+            with contextlib.redirect_stdout(io.StringIO()):
+                processed = process_chunk(data, val)
+                result = dict(sample=sample, val=val, idx=idx, events=len(processed), histograms=PLAN.fill(processed))
+            results.append(serialization.dumps(result))
+    return {'chunks': chunks, 'results': results}
+
+
+def bench_codec(bodies, encoding, level):
+    """
+    Total raw and compressed bytes, and compress/decompress seconds, over `bodies`.
+    """
+    raw, compressed, compress_seconds, decompress_seconds = 0, 0, 0.0, 0.0
+    for body in bodies:
+        start = time.perf_counter()
+        packed = serialization.compress(body, encoding, level)
+        compress_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        unpacked = serialization.decompress(packed, encoding)
+        decompress_seconds += time.perf_counter() - start
+
+        assert unpacked == body
+        raw += len(body)
+        compressed += len(packed)
+    return {'raw_bytes': raw, 'bytes': compressed,
+            'compress_seconds': compress_seconds, 'decompress_seconds': decompress_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark message body compression codecs.")
+    parser.add_argument("--data-path", default=DATA_PATH, help="directory containing Data/ and MC/ ROOT files")
+    parser.add_argument("--chunk-size", type=int, default=None, help="events per chunk (default: sized per file)")
+    parser.add_argument("--bandwidth", type=float, default=100.0,
+                        help="broker bandwidth in MB/s used for the end-to-end column (default: 100, about 1 Gbit/s)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for kind, bodies in message_bodies(args.data_path, args.chunk_size).items():
+        print(f"\n{kind}: {len(bodies)} messages, {sum(map(len, bodies)) / 1e6:.1f} MB serialized")
+        print(f"{'codec':<12}{'ratio':>8}{'comp MB/s':>12}{'decomp MB/s':>13}"
+              f"{'break-even MB/s':>17}{f'@{args.bandwidth:g} MB/s s':>16}")
+        results[kind] = {}
+        for encoding, level in CODECS:
+            try:
+                stats = bench_codec(bodies, encoding, level)
+            except ImportError as e:
+                print(f"{encoding:<12}skipped ({e})")
+                continue
+
+            name = encoding if level is None else f"{encoding}-{level}"
+            cpu = stats['compress_seconds'] + stats['decompress_seconds']
+            saved = stats['raw_bytes'] - stats['bytes']
+            # Compressing pays off while the transfer time it saves exceeds the CPU time it costs
+            stats['break_even_mb_s'] = saved / cpu / 1e6 if cpu else float('inf')
+            stats['end_to_end_seconds'] = cpu + stats['bytes'] / (args.bandwidth * 1e6)
+            results[kind][name] = stats
+
+            raw_mb = stats['raw_bytes'] / 1e6
+            if encoding == 'identity':
+                throughput = f"{'-':>12}{'-':>13}{'-':>17}"
+            else:
+                throughput = (f"{raw_mb / stats['compress_seconds']:>12.0f}{raw_mb / stats['decompress_seconds']:>13.0f}"
+                              f"{stats['break_even_mb_s']:>17.0f}")
+            print(f"{name:<12}{stats['raw_bytes'] / stats['bytes']:>8.2f}{throughput}{stats['end_to_end_seconds']:>16.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Write synthetic 4-lepton `mini` trees in the same layout as the ATLAS Open Data
+4lep samples (Data/<val>.4lep.root and MC/mc_<DSID>.<val>.4lep.root), so the
+pipeline can be run and benchmarked without network access.
+
+    python -m benchmarks.generate --output fixtures/ --events 100000
+"""
+import argparse
+import os
+
+import awkward as ak
+import numpy as np
+import uproot
+
+from hzz.analysis import PLAN
+from hzz.constants import samples
+from hzz.loader import file_path
+
+MeV_per_GeV = 1000.0
+
+
+def make_events(n_events, rng, is_data=False):
+    """
+    Build one basket's worth of events with the 11 branches used by the analysis.
+    Each event has at least four leptons, pT-ordered, with a tail of 5- and 6-lepton events.
+    The lepton branches are zipped under 'lep' so uproot writes them as lep_pt, lep_eta, ...
+    """
+    # 4 leptons for most events, like the 4lep skim, with a few extra ones
+    n_leptons = 4 + np.minimum(rng.geometric(0.85, n_events) - 1, 2)
+    n_total = int(n_leptons.sum())
+
+    # pT sorted in descending order inside each event, as in the real ntuples
+    pt = ak.unflatten(rng.exponential(25 * MeV_per_GeV, n_total) + 7 * MeV_per_GeV, n_leptons)
+    pt = ak.sort(pt, axis=1, ascending=False)
+    eta = ak.unflatten(np.clip(rng.normal(0, 1.3, n_total), -2.5, 2.5), n_leptons)
+    phi = ak.unflatten(rng.uniform(-np.pi, np.pi, n_total), n_leptons)
+
+    branches = {
+        'lep': ak.zip({
+            'pt': ak.values_astype(pt, np.float32),
+            'eta': ak.values_astype(eta, np.float32),
+            'phi': ak.values_astype(phi, np.float32),
+            'E': ak.values_astype(pt * np.cosh(eta), np.float32),
+            'charge': ak.unflatten(rng.choice(np.array([-1, 1], dtype=np.int32), n_total), n_leptons),
+            'type': ak.unflatten(rng.choice(np.array([11, 13], dtype=np.uint32), n_total), n_leptons),
+        }),
+    }
+
+    # Data carries unit weights, MC gets scale factors scattered around one
+    for variable in PLAN.weight_factors:
+        if is_data:
+            branches[variable] = np.ones(n_events, dtype=np.float32)
+        else:
+            branches[variable] = rng.normal(1.0, 0.05, n_events).astype(np.float32)
+
+    return branches
+
+
+def generate(output, n_events, seed=0, basket_size=20000):
+    """
+    Write one synthetic TTree per sample file into `output`, `basket_size` entries per basket.
+    Returns the total bytes written.
+    """
+    rng = np.random.default_rng(seed)
+    output = os.path.join(output, "")
+    total_bytes = 0
+
+    for sample, sample_info in samples.items():
+        for val in sample_info['list']:
+            path = file_path(sample, val, output)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with uproot.recreate(path) as file:
+                for start in range(0, n_events, basket_size):
+                    events = make_events(min(basket_size, n_events - start), rng, is_data=(sample == 'data'))
+                    if start == 0:
+                        file.mktree("mini", {name: branch.type if isinstance(branch, ak.Array) else branch.dtype
+                                             for name, branch in events.items()})
+                    file["mini"].extend(events)
+
+            total_bytes += os.path.getsize(path)
+            print(f"Wrote {n_events} events to {path}")
+
+    return total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic 4lep ROOT files.")
+    parser.add_argument("--output", default="fixtures", help="directory to write Data/ and MC/ into")
+    parser.add_argument("--events", type=int, default=100000, help="events per file")
+    parser.add_argument("--basket-size", type=int, default=20000, help="entries written per basket")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    total_bytes = generate(args.output, args.events, args.seed, args.basket_size)
+    print(f"Wrote {total_bytes / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
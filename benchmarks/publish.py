@@ -0,0 +1,78 @@
+"""
+Compare the loader's confirmed publishing with one-at-a-time confirms.
+
+Publishes --messages bodies of --size bytes to a scratch queue, first on a
+BlockingChannel in confirm mode (each basic_publish waits for its confirm),
+then through hzz.backends.rabbitmq.ConfirmPublisher at each --window.
+
+    RABBITMQ_HOST=localhost python -m benchmarks.publish --messages 5000 --size 65536
+"""
+import argparse
+import os
+import time
+
+import pika
+
+from hzz.backends.rabbitmq import ConfirmPublisher, parameters, publish_body
+
+QUEUE = "publish_benchmark"
+
+
+def purge():
+    connection = pika.BlockingConnection(parameters)
+    channel = connection.channel()
+    channel.queue_declare(queue=QUEUE, durable=True)
+    channel.queue_purge(queue=QUEUE)
+    return connection, channel
+
+
+def bench_sync(body, n):
+    connection, channel = purge()
+    channel.confirm_delivery()
+    start = time.perf_counter()
+    for _ in range(n):
+        publish_body(channel, QUEUE, body)
+    seconds = time.perf_counter() - start
+    connection.close()
+    return seconds
+
+
+def bench_window(body, n, window, batch_size):
+    connection, channel = purge()
+    connection.close()
+    publisher = ConfirmPublisher([QUEUE], window=window, batch_size=batch_size)
+    start = time.perf_counter()
+    for _ in range(n):
+        publish_body(publisher, QUEUE, body)
+    publisher.flush()
+    seconds = time.perf_counter() - start
+    publisher.close()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark confirmed publishing to RabbitMQ.")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=64 * 1024, help="body size in bytes")
+    parser.add_argument("--windows", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    body = os.urandom(args.size)
+    print(f"{'mode':<16}{'seconds':>10}{'msg/s':>10}{'MB/s':>10}")
+    runs = [('sync confirms', lambda: bench_sync(body, args.messages))]
+    runs += [(f'window {window}', lambda window=window: bench_window(body, args.messages, window, args.batch_size))
+             for window in args.windows]
+    for name, run in runs:
+        seconds = run()
+        print(f"{name:<16}{seconds:>10.3f}{args.messages / seconds:>10.0f}"
+              f"{args.messages * args.size / seconds / 1e6:>10.1f}")
+
+    # Leave no benchmark messages behind
+    connection, channel = purge()
+    channel.queue_delete(queue=QUEUE)
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
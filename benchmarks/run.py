@@ -0,0 +1,215 @@
+"""
+Benchmark the pipeline on local ROOT files (see benchmarks/generate.py).
+
+Reports events/s, bytes/s and peak RSS for each stage of the analysis
+(read, serialize, cut, derive, weight, histogram, aggregate), then the
+end-to-end throughput of the Outline, local and RabbitMQ modes.
+
+    python -m benchmarks.run --data-path fixtures/ --modes outline local rabbitmq
+
+The rabbitmq mode needs a broker on --rabbitmq-host, e.g.
+`docker run -p 5672:5672 -e RABBITMQ_DEFAULT_USER=user -e RABBITMQ_DEFAULT_PASS=password rabbitmq:3`.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import awkward as ak
+import numpy as np
+
+from hzz import serialization
+from hzz.backends import local
+from hzz.analysis import PLAN
+from hzz.constants import DATA_PATH, samples
+from hzz.loader import chunk_ranges, read_chunk
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ['read', 'serialize', 'cut', 'derive', 'weight', 'histogram', 'aggregate']
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    High-water mark of resident memory in MB (ru_maxrss is in kB on Linux).
+    """
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def dataset_size(data_path):
+    """
+    Total events and on-disk bytes of every sample file under `data_path`.
+    """
+    events, nbytes = 0, 0
+    for sample in samples:
+        for val, idx, path, entry_start, entry_stop in chunk_ranges(sample, step_size=sys.maxsize, data_path=data_path):
+            events += entry_stop - entry_start
+            nbytes += os.path.getsize(path)
+    return events, nbytes
+
+
+class StageTotals:
+    """
+    Accumulates wall time, events and bytes handled by each stage.
+    """
+
+    def __init__(self):
+        self.totals = {stage: {'seconds': 0.0, 'events': 0, 'bytes': 0, 'peak_rss_mb': 0.0} for stage in STAGES}
+
+    @contextlib.contextmanager
+    def time(self, stage, events, nbytes=0):
+        """
+        Time the body of the with-block. It may set record['bytes'] when the size is only known afterwards.
+        """
+        record = {'bytes': nbytes}
+        start = time.perf_counter()
+        yield record
+        totals = self.totals[stage]
+        totals['seconds'] += time.perf_counter() - start
+        totals['events'] += events
+        totals['bytes'] += record['bytes']
+        totals['peak_rss_mb'] = peak_rss_mb()
+
+
+def bench_stages(data_path, step_size):
+    """
+    Run every stage of the analysis on each chunk in turn, timing them separately.
+    """
+    stages = StageTotals()
+    grouped_data = {key: [] for key in samples.keys()}
+
+    for sample in samples:
+        for val, idx, path, entry_start, entry_stop in chunk_ranges(sample, step_size, data_path):
+            n = entry_stop - entry_start
+            with stages.time('read', n) as record:
+                data = read_chunk(path, entry_start, entry_stop)
+                record['bytes'] = data.nbytes
+
+            # Round trip through the message encoding used between services
+            with stages.time('serialize', n) as record:
+                body = serialization.dumps({'sample': sample, 'val': val, 'idx': idx, 'data': data})
+                record['bytes'] = len(body)
+                data = serialization.loads(body)['data']
+
+            with stages.time('cut', n, data.nbytes):
+                data = PLAN.select(data)
+
+            n = len(data)
+            with stages.time('derive', n, data.nbytes):
+                data = PLAN.derive(data)
+
+            # Data is histogrammed with unit weights
+            with stages.time('weight', n, data.nbytes):
+                if sample != 'data':
+                    data = PLAN.weigh(data, val)
+                else:
+                    data['totalWeight'] = np.ones(n)
+
+            with stages.time('histogram', n, data.nbytes):
+                PLAN.fill(data)
+
+            grouped_data[sample].append(data)
+
+    for sample, chunks in grouped_data.items():
+        with stages.time('aggregate', sum(len(chunk) for chunk in chunks), sum(chunk.nbytes for chunk in chunks)):
+            ak.concatenate(chunks) if chunks else ak.Array([])
+
+    return stages.totals
+
+
+def run_rabbitmq(data_path, n_workers, host):
+    """
+    Run loader, workers and aggregator as separate processes against a broker on `host`.
+    """
+    import pika
+    from hzz.backends.rabbitmq import QUEUE_ARGUMENTS, QUEUE_NAME, RESULTS_QUEUE
+
+    env = dict(os.environ, RABBITMQ_HOST=host, DATA_PATH=data_path, PYTHONPATH=REPO_ROOT, MPLBACKEND="Agg")
+
+    # Start from empty queues so leftovers of an earlier run don't count
+    credentials = pika.PlainCredentials(os.getenv("RABBITMQ_USER", "user"), os.getenv("RABBITMQ_PASSWORD", "password"))
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host, 5672, '/', credentials))
+    channel = connection.channel()
+    for queue in [QUEUE_NAME, RESULTS_QUEUE]:
+        channel.queue_declare(queue=queue, durable=True, arguments=QUEUE_ARGUMENTS.get(queue))
+        channel.queue_purge(queue=queue)
+    connection.close()
+
+    def service(code):
+        return subprocess.Popen([sys.executable, "-c", code], env=env, cwd=REPO_ROOT,
+                                stdout=subprocess.DEVNULL)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        aggregator = service(f"from hzz.services import aggregator; aggregator.main({os.path.join(output_dir, 'plot.png')!r})")
+        workers = [service("from hzz.services import worker; worker.main()") for _ in range(n_workers)]
+        loader = service("from hzz.services import loader; loader.main()")
+
+        loader.wait()
+        aggregator.wait()
+        for worker in workers:
+            worker.terminate()
+            worker.wait()
+
+
+def bench_mode(mode, data_path, step_size, workers, rabbitmq_host):
+    """
+    Time one end-to-end run of `mode`. Returns (seconds, peak RSS of the largest process in MB).
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'outline':
+            local.run(step_size=1000000, data_path=data_path, max_workers=1)
+        elif mode == 'local':
+            local.run(step_size=step_size, data_path=data_path, max_workers=workers)
+        elif mode == 'rabbitmq':
+            run_rabbitmq(data_path, workers or 1, rabbitmq_host)
+    elapsed = time.perf_counter() - start
+    return elapsed, max(peak_rss_mb(), peak_rss_mb(resource.RUSAGE_CHILDREN))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the H->ZZ->4l pipeline on local ROOT files.")
+    parser.add_argument("--data-path", default=DATA_PATH, help="directory containing Data/ and MC/ ROOT files")
+    parser.add_argument("--chunk-size", type=int, default=None, help="events per chunk (default: sized per file)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for local/rabbitmq modes")
+    parser.add_argument("--modes", nargs="+", default=['outline', 'local'], choices=['outline', 'local', 'rabbitmq'])
+    parser.add_argument("--rabbitmq-host", default="localhost")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    data_path = os.path.join(args.data_path, "") if "://" not in args.data_path else args.data_path
+    events, nbytes = dataset_size(data_path)
+    print(f"Dataset: {events} events, {nbytes / 1e6:.1f} MB on disk")
+
+    results = {'events': events, 'bytes': nbytes, 'stages': {}, 'modes': {}}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        stage_totals = bench_stages(data_path, args.chunk_size)
+
+    print(f"\n{'stage':<12}{'seconds':>10}{'events/s':>14}{'MB/s':>10}{'peak RSS MB':>14}")
+    for stage, totals in stage_totals.items():
+        seconds = totals['seconds'] or float('nan')
+        print(f"{stage:<12}{totals['seconds']:>10.3f}{totals['events'] / seconds:>14.0f}"
+              f"{totals['bytes'] / seconds / 1e6:>10.1f}{totals['peak_rss_mb']:>14.0f}")
+        results['stages'][stage] = totals
+
+    print(f"\n{'mode':<12}{'seconds':>10}{'events/s':>14}{'MB/s':>10}{'peak RSS MB':>14}")
+    for mode in args.modes:
+        seconds, rss = bench_mode(mode, data_path, args.chunk_size, args.workers, args.rabbitmq_host)
+        print(f"{mode:<12}{seconds:>10.3f}{events / seconds:>14.0f}{nbytes / seconds / 1e6:>10.1f}{rss:>14.0f}")
+        results['modes'][mode] = {'seconds': seconds, 'events_per_s': events / seconds,
+                                  'bytes_per_s': nbytes / seconds, 'peak_rss_mb': rss}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
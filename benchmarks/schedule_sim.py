@@ -0,0 +1,85 @@
+"""
+Compare the makespan of publishing chunks in samples order with longest-first
+scheduling (hzz.scheduling) for worker pools of several sizes.
+
+Without --data-path the chunks come from a synthetic model of the 4lep files.
+With it, the real chunk ranges are used, costed from CHUNK_COSTS or
+HZZ_METRICS_DIR like the loader does. Exits non-zero if longest-first is
+ever slower than samples order.
+
+    python -m benchmarks.schedule_sim
+    CHUNK_COSTS=chunk_costs.json python -m benchmarks.schedule_sim --data-path fixtures/
+"""
+import argparse
+import sys
+
+from hzz.chunking import load_costs
+from hzz.constants import samples
+from hzz.scheduling import estimate, longest_first, makespan
+
+# (entries, seconds per event) of each file: data is cheap, the Z/ttbar backgrounds are big and slow
+SYNTHETIC = {
+    'data_A': (40000, 2e-6), 'data_B': (150000, 2e-6), 'data_C': (230000, 2e-6), 'data_D': (380000, 2e-6),
+    'Zee': (900000, 6e-6), 'Zmumu': (1000000, 6e-6), 'ttbar_lep': (700000, 8e-6),
+    'llll': (550000, 5e-6),
+    'ggH125_ZZ4lep': (160000, 5e-6), 'VBFH125_ZZ4lep': (190000, 5e-6),
+    'WH125_ZZ4lep': (10000, 5e-6), 'ZH125_ZZ4lep': (14000, 5e-6),
+}
+
+
+def synthetic_chunks(chunk_entries):
+    """
+    (sample, val, idx, path, entry_start, entry_stop) chunks of the synthetic files in samples order, and their costs.
+    """
+    chunks = []
+    for sample in samples:
+        for val in samples[sample]['list']:
+            entries = SYNTHETIC[val][0]
+            for idx, entry_start in enumerate(range(0, entries, chunk_entries)):
+                chunks.append((sample, val, idx, None, entry_start, min(entry_start + chunk_entries, entries)))
+    return chunks, {val: seconds for val, (entries, seconds) in SYNTHETIC.items()}
+
+
+def file_chunks(data_path, chunk_entries):
+    """
+    Chunks of the ROOT files under `data_path` in samples order, and the measured costs.
+    """
+    from hzz.loader import chunk_ranges
+
+    chunks = [(sample, *chunk) for sample in samples for chunk in chunk_ranges(sample, chunk_entries, data_path)]
+    return chunks, load_costs()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate samples-order vs longest-first chunk scheduling.")
+    parser.add_argument("--data-path", help="use the chunks of these ROOT files instead of the synthetic model")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="events per chunk (default: 250000 synthetic, sized per file for --data-path)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8, 16])
+    args = parser.parse_args()
+
+    if args.data_path:
+        chunks, costs = file_chunks(args.data_path, args.chunk_size)
+    else:
+        chunks, costs = synthetic_chunks(args.chunk_size or 250000)
+
+    fifo = [estimate(chunk[1], chunk[4], chunk[5], costs) for chunk in chunks]
+    lpt = [cost for cost, chunk in longest_first(chunks, costs)]
+    print(f"{len(chunks)} chunks, {sum(fifo):.1f}s of work, longest chunk {max(fifo):.2f}s")
+
+    ok = True
+    print(f"{'workers':>8}{'samples order s':>17}{'longest first s':>17}{'lower bound s':>15}{'saved':>8}")
+    for workers in args.workers:
+        fifo_makespan, lpt_makespan = makespan(fifo, workers), makespan(lpt, workers)
+        # No schedule beats perfect balance or the longest single chunk
+        bound = max(sum(fifo) / workers, max(fifo))
+        print(f"{workers:>8}{fifo_makespan:>17.2f}{lpt_makespan:>17.2f}{bound:>15.2f}"
+              f"{1 - lpt_makespan / fifo_makespan:>8.0%}")
+        ok = ok and lpt_makespan <= fifo_makespan + 1e-9
+
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
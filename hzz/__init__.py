@@ -0,0 +1,7 @@
+"""
+Shared H -> ZZ* -> 4l analysis code.
+
+Every deployment (Outline.py, VolumesBased, RabbitIntegration and Kubernetes)
+imports the selection, weighting, histogramming and transport code from here,
+so a change only has to be made once.
+"""
@@ -0,0 +1,483 @@
+"""
+The analysis as a compiled plan, from a declarative TOML description (hzz/analysis.toml).
+
+Compiling the description:
+
+- finds the minimal set of branches to read, from the names the expressions use;
+- fuses each derived quantity into the expressions that use it once, so a cut like
+  isin(sum_lep_type, ...) becomes a single expression over the lep_type branch;
+- compiles every expression once, instead of once per chunk.
+
+At run time the cuts are evaluated on only the columns they need, narrowing the
+surviving events as they go, and the full event record is filtered once at the
+end. Cuts run in order of their observed selectivity, most selective first, so
+later cuts see as few events as possible.
+
+The selected events fill every configured 1D/2D histogram in one pass, with
+one np.bincount per histogram. The sums of weights (and of squared weights)
+add up across chunks, so workers send filled histograms and the aggregator
+only adds them.
+
+ANALYSIS_CONFIG selects another description; PLAN is the compiled default.
+"""
+import ast
+import copy
+import functools
+import hashlib
+import inspect
+import operator
+import os
+import tomllib
+
+import awkward as ak
+import numpy as np
+import vector
+
+from . import metrics
+from .constants import GeV, MeV
+from .weights import calc_weight, calc_weights
+
+ANALYSIS_CONFIG = os.getenv("ANALYSIS_CONFIG", os.path.join(os.path.dirname(__file__), "analysis.toml"))
+
+
+def invariant_mass(lep_pt, lep_eta, lep_phi, lep_E):
+    """
+    Invariant mass of the 4-lepton state, in the units of the inputs ([:, i] selects the i-th lepton in each event).
+    """
+    p4 = vector.zip({"pt": lep_pt, "eta": lep_eta, "phi": lep_phi, "E": lep_E})
+    return (p4[:, 0] + p4[:, 1] + p4[:, 2] + p4[:, 3]).M
+
+
+def isin(values, choices):
+    """
+    True where `values` equals any of `choices`; works for numpy and awkward arrays alike.
+    """
+    return functools.reduce(operator.or_, [values == choice for choice in choices])
+
+
+def lookup(values, keys):
+    """
+    Compact code of each value: i + 1 where it equals keys[i], 0 where it matches none.
+    """
+    values = ak.to_numpy(values)
+    codes = np.zeros(len(values), dtype=np.int8)
+    for code, key in enumerate(keys, start=1):
+        codes[values == key] = code
+    return codes
+
+
+# Everything an expression can refer to besides branches and derived quantities
+FUNCTIONS = {'invariant_mass': invariant_mass, 'isin': isin, 'lookup': lookup, 'abs': abs, 'np': np, 'ak': ak}
+CONSTANTS = {'MeV': MeV, 'GeV': GeV}
+GLOBALS = {'__builtins__': {}, **FUNCTIONS, **CONSTANTS}
+
+
+def names(tree):
+    """
+    Names an expression tree reads.
+    """
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+class Fuse(ast.NodeTransformer):
+    """
+    Inline derived quantities that an expression uses exactly once.
+    """
+
+    def __init__(self, derived, counts):
+        self.derived = derived
+        self.counts = counts
+
+    def visit_Name(self, node):
+        if node.id in self.derived and self.counts[node.id] == 1:
+            # Fused in turn, counting the names it uses itself
+            return fuse(self.derived[node.id], self.derived)
+        return node
+
+
+def fuse(tree, derived):
+    counts = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            counts[node.id] = counts.get(node.id, 0) + 1
+    return ast.fix_missing_locations(Fuse(derived, counts).visit(copy.deepcopy(tree)))
+
+
+class Scope(dict):
+    """
+    Evaluation namespace of the expressions: columns of `data` (restricted to the events at `index`)
+    and derived quantities, looked up or computed on first use.
+    """
+
+    def __init__(self, plan, data, index=None):
+        super().__init__()
+        self.plan = plan
+        self.data = data
+        self.index = index
+
+    def __missing__(self, name):
+        # Derived quantities already stored with the events are not computed again
+        if name in self.data.fields:
+            value = self.data[name] if self.index is None else self.data[name][self.index]
+        elif name in self.plan.derived:
+            value = eval(self.plan.derived[name], GLOBALS, self)
+        else:
+            raise KeyError(name)  # eval then looks it up in GLOBALS
+        self[name] = value
+        return value
+
+    def narrow(self, passed, index):
+        """
+        Keep only the events where `passed`, now at `index` of `data`. Derived quantities computed so far are
+        narrowed with them; branch columns are read again for the new index when needed.
+        """
+        for name in list(self):
+            if name in self.plan.derived:
+                self[name] = self[name][passed]
+            else:
+                del self[name]
+        self.index = index
+
+
+class Cut:
+    """
+    One compiled selection requirement, with its pass rate so far.
+    """
+
+    def __init__(self, name, expr, code):
+        self.name = name
+        self.expr = expr
+        self.code = code
+        self.seen = 0
+        self.passed = 0
+
+    def pass_rate(self):
+        return self.passed / self.seen if self.seen else 1.0
+
+
+class Axis:
+    """
+    One axis of a histogram: compiled expression, bin edges and label.
+    """
+
+    def __init__(self, expr, code, bins, label=None, unit=None):
+        self.expr = expr
+        self.code = code
+        self.xmin, self.xmax, self.step = bins
+        self.edges = np.linspace(self.xmin, self.xmax, round((self.xmax - self.xmin) / self.step) + 1)
+        self.centres = self.edges[:-1] + self.step / 2
+        self.label = label or expr
+        self.unit = unit
+
+
+class Histogram:
+    """
+    A 1D or 2D histogram to fill from the selected events. A `split` histogram also fills one copy per
+    channel, each a Histogram with its `channel` set. 1D histograms expose their axis' binning directly
+    (edges, centres, label, ...).
+    """
+
+    def __init__(self, name, axes, split=False, channel=None):
+        self.name = name
+        self.axes = axes
+        self.split = split
+        self.channel = channel
+        self.shape = tuple(len(axis.edges) - 1 for axis in axes)
+
+    def __getattr__(self, attribute):
+        if attribute in ('expr', 'code', 'xmin', 'xmax', 'step', 'edges', 'centres', 'label', 'unit'):
+            return getattr(self.axes[0], attribute)
+        raise AttributeError(attribute)
+
+
+def bin_index(values, edges):
+    """
+    Bin of each value, -1 or len(edges) - 1 when outside; like np.histogram the last bin includes its right edge.
+    """
+    index = np.searchsorted(edges, values, side='right') - 1
+    index[values == edges[-1]] = len(edges) - 2
+    return index
+
+
+class Plan:
+    """
+    Compiled analysis: branches to read, cuts, derived quantities, weight factors and histograms.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.lumi = config.get('lumi', 10)
+        self.fraction = config.get('fraction', 1.0)
+
+        derived_trees = {name: ast.parse(expr, mode='eval').body for name, expr in config.get('derived', {}).items()}
+        for name in derived_trees:
+            self.check_acyclic(name, derived_trees)
+        # Every fused expression, to find the branches they read
+        trees = []
+
+        def expression(expr, inline=True):
+            tree = ast.parse(expr, mode='eval').body
+            trees.append(fuse(tree, derived_trees))
+            # Expressions evaluated after derive() read the stored quantities rather than recomputing them
+            return self.compile(trees[-1] if inline else tree)
+
+        # Fully fused derived quantities, each computed without looking up the others
+        self.derived = {}
+        self.derived_exprs = {}  # the fused source of each, which identifies what a stored column holds
+        for name, expr in config.get('derived', {}).items():
+            self.derived[name] = expression(expr)
+            self.derived_exprs[name] = ast.unparse(trees[-1])
+
+        # Derived quantities that cuts use are computed once during selection and kept (see select)
+        self.cuts = [Cut(name, expr, expression(expr, inline=False)) for name, expr in config.get('cuts', {}).items()]
+        cut_trees = trees[-len(self.cuts):] if self.cuts else []
+
+        self.weight_factors = list(config.get('weight', {}).get('factors', []))
+        # All a cutflow (hzz.cutflow) needs to read
+        self.cutflow_branches = sorted(set().union(*map(names, cut_trees), self.weight_factors)
+                                       - set(FUNCTIONS) - set(CONSTANTS) - set(derived_trees))
+
+        # Systematic variations: replacement expressions for some of the weight factors
+        self.variations = {name: {factor: expression(expr) for factor, expr in replacements.items()}
+                           for name, replacements in config.get('variations', {}).items()}
+        for name, replacements in self.variations.items():
+            unknown = set(replacements) - set(self.weight_factors)
+            if unknown:
+                raise ValueError(f"Variation {name} replaces {sorted(unknown)}, which are not weight factors")
+
+        # Event categories that histograms can be split into: the derived quantity holding each event's
+        # channel code (1, 2, ... for the channels in order, 0 for none) and the channel names
+        channels = config.get('channels', {})
+        self.channel_code = channels.get('code')
+        self.channels = list(channels.get('names', []))
+        if self.channels and self.channel_code not in self.derived:
+            raise ValueError(f"Channel code {self.channel_code!r} is not a derived quantity")
+
+        self.histograms = {}
+        for name, spec in config.get('histograms', {}).items():
+            exprs = spec.get('expr', name)
+            # 2D histograms list one expression, binning and label per axis
+            if isinstance(exprs, str):
+                exprs, bins, labels = [exprs], [spec['bins']], [spec.get('label')]
+            else:
+                bins, labels = spec['bins'], spec.get('label', [None] * len(exprs))
+            axes = [Axis(expr, expression(expr, inline=False), axis_bins, label, spec.get('unit'))
+                    for expr, axis_bins, label in zip(exprs, bins, labels)]
+            split = bool(spec.get('channels')) and bool(self.channels)
+            self.histograms[name] = Histogram(name, axes, split=split)
+            # Per-channel copies, named <histogram>_<channel>, filled together with the inclusive one
+            if split:
+                for channel in self.channels:
+                    self.histograms[f"{name}_{channel}"] = Histogram(f"{name}_{channel}", axes, channel=channel)
+
+        # Branches: every name the fused expressions read that is not a function, constant or derived quantity
+        used = set(self.weight_factors)
+        for tree in trees:
+            used |= names(tree)
+        self.branches = sorted(used - set(FUNCTIONS) - set(CONSTANTS) - set(derived_trees))
+
+    @staticmethod
+    def check_acyclic(name, trees, path=()):
+        if name in path:
+            raise ValueError(f"Derived quantities depend on each other in a cycle: {' -> '.join(path + (name,))}")
+        for dependency in names(trees[name]) & set(trees):
+            Plan.check_acyclic(dependency, trees, path + (name,))
+
+    @staticmethod
+    def compile(tree):
+        return compile(ast.Expression(tree), '<analysis>', 'eval')
+
+    def ordered_cuts(self):
+        """
+        Cuts, most selective (lowest pass rate so far) first; conjunctions can be evaluated in any order.
+        """
+        return sorted(self.cuts, key=Cut.pass_rate)
+
+    def select(self, data, chunk_metrics=metrics.NULL):
+        """
+        Events of `data` passing every cut, with the derived quantities the cuts computed (such as the
+        channel code) stored for them.
+        """
+        index = None  # all events
+        scope = Scope(self, data)
+        for cut in self.ordered_cuts():
+            with chunk_metrics.stage(f'cut_{cut.name}'):
+                passed = np.asarray(ak.to_numpy(eval(cut.code, GLOBALS, scope)), dtype=bool)
+                cut.seen += len(passed)
+                index = np.flatnonzero(passed) if index is None else index[passed]
+                cut.passed += len(index)
+                scope.narrow(passed, index)
+        selected = data if index is None else data[index]
+        for name, value in scope.items():
+            selected[name] = value
+        return selected
+
+    def cutflow(self, data, weights):
+        """
+        Events and sum of `weights` before any cut and after each cut in turn, in the configured order:
+        [(cut, events, weighted)], with 'all' for the events before the cuts.
+        """
+        rows = [('all', len(data), float(np.sum(weights)))]
+        index = None  # all events
+        scope = Scope(self, data)
+        for cut in self.cuts:
+            passed = np.asarray(ak.to_numpy(eval(cut.code, GLOBALS, scope)), dtype=bool)
+            index = np.flatnonzero(passed) if index is None else index[passed]
+            scope.narrow(passed, index)
+            rows.append((cut.name, len(index), float(np.sum(weights[index]))))
+        return rows
+
+    def derive(self, data, chunk_metrics=metrics.NULL):
+        """
+        Add every derived quantity to `data` as a field.
+        """
+        scope = Scope(self, data)
+        for name in self.derived:
+            with chunk_metrics.stage(name):
+                data[name] = scope[name]
+        return data
+
+    def weigh(self, data, val, chunk_metrics=metrics.NULL):
+        """
+        Add the total Monte Carlo event weight of file `val` as 'totalWeight' and, when there are
+        variations, the varied weights as 'weightVariations' (one fixed-size list per event).
+        """
+        # Weights stored with the events (read from a skim) are not computed again
+        if 'totalWeight' in data.fields and ('weightVariations' in data.fields or not self.variations):
+            return data
+        with chunk_metrics.stage('weight'):
+            if not self.variations:
+                data['totalWeight'] = calc_weight(self.weight_factors, val, data, self.lumi)
+                return data
+
+            scope = Scope(self, data)
+            variations = [{factor: ak.to_numpy(eval(code, GLOBALS, scope)) for factor, code in replacements.items()}
+                          for replacements in self.variations.values()]
+            weights = calc_weights(self.weight_factors, val, data, self.lumi, variations)
+            # Contiguous copies, which parquet (the result cache) needs
+            data['totalWeight'] = np.ascontiguousarray(weights[:, 0])
+            data['weightVariations'] = ak.from_numpy(np.ascontiguousarray(weights[:, 1:]))
+        return data
+
+    def values(self, histogram, data):
+        """
+        Values of `histogram`'s (first) expression for the events of `data`, as a numpy array.
+        """
+        if not len(data):
+            return np.array([])
+        return ak.to_numpy(eval(histogram.code, GLOBALS, Scope(self, data)))
+
+    def fill(self, data, histograms=None, chunk_metrics=metrics.NULL):
+        """
+        Fill every histogram (or those given) from the events of `data`, weighted by 'totalWeight' when present.
+        Returns {name: {'sumw': array, 'sumw2': array}}, which add up across chunks (see merge). Events with
+        'weightVariations' also fill 'variations', the sums of weights of each variation in turn.
+        """
+        filled = {}
+        with chunk_metrics.stage('histogram'):
+            scope = Scope(self, data) if len(data) else None
+            for histogram in histograms or self.histograms.values():
+                # Per-channel copies are filled along with their inclusive histogram
+                if histogram.channel is None:
+                    filled.update(self.fill_histogram(histogram, data, scope))
+        return filled
+
+    def fill_histogram(self, histogram, data, scope):
+        """
+        Sums of `histogram` and, for a split histogram, of each of its channels, in one bincount per sum.
+        """
+        names = [histogram.name] + ([f"{histogram.name}_{channel}" for channel in self.channels]
+                                    if histogram.split else [])
+        if scope is None:
+            empty = {'sumw': np.zeros(histogram.shape), 'sumw2': np.zeros(histogram.shape)}
+            if self.variations:
+                empty['variations'] = np.zeros((len(self.variations),) + histogram.shape)
+            return {name: dict(empty) for name in names}
+
+        weights = ak.to_numpy(data['totalWeight']) if 'totalWeight' in data.fields else np.ones(len(data))
+        variations = ak.to_numpy(data['weightVariations']) if 'weightVariations' in data.fields else None
+        # Split histograms fill category 0 (no channel), 1, 2, ... by channel code
+        categories = np.zeros(len(data), dtype=np.int64)
+        if histogram.split:
+            categories = ak.to_numpy(scope[self.channel_code]).astype(np.int64)
+            categories[(categories < 0) | (categories > len(self.channels))] = 0
+        n_categories = len(self.channels) + 1 if histogram.split else 1
+
+        # Per-lepton quantities fill one entry per lepton, each with its event's weights
+        values = [eval(axis.code, GLOBALS, scope) for axis in histogram.axes]
+        events, *values = [ak.to_numpy(ak.flatten(array, axis=None))
+                           for array in ak.broadcast_arrays(ak.Array(np.arange(len(data))), *values)]
+
+        # Flat bin number over the category and all axes, then one bincount per sum
+        flat = categories[events]
+        inside = np.ones(len(events), dtype=bool)
+        for value, axis, nbins in zip(values, histogram.axes, histogram.shape):
+            index = bin_index(value, axis.edges)
+            inside &= (index >= 0) & (index < nbins)
+            flat = flat * nbins + index
+        flat, events = flat[inside], events[inside]
+        size = n_categories * int(np.prod(histogram.shape))
+        shape = (n_categories,) + histogram.shape
+        sums = {'sumw': np.bincount(flat, weights=weights[events], minlength=size).reshape(shape),
+                'sumw2': np.bincount(flat, weights=weights[events]**2, minlength=size).reshape(shape)}
+
+        if variations is not None:
+            # Every variation in the same bincount: variation v of bin b is bin v * size + b
+            n_variations = variations.shape[1]
+            varied_bins = flat[:, np.newaxis] + size * np.arange(n_variations)
+            sums['variations'] = np.bincount(varied_bins.ravel(), weights=variations[events].ravel(),
+                                             minlength=size * n_variations).reshape((n_variations,) + shape)
+
+        # The inclusive histogram adds up every category; category i + 1 is channel i
+        filled = {histogram.name: {key: value.sum(axis=-len(shape)) for key, value in sums.items()}}
+        for category, name in enumerate(names[1:], start=1):
+            filled[name] = {key: np.take(value, category, axis=-len(shape)) for key, value in sums.items()}
+        return filled
+
+    def fingerprint(self, *sections):
+        """
+        Hash of the given config sections (all when empty) and of the code that compiles and evaluates
+        expressions, for cache keys. The code of each stage is up to the caller.
+        """
+        digest = hashlib.sha256()
+        for part in (invariant_mass, isin, lookup, names, Fuse, fuse, Scope, Plan.compile):
+            digest.update(inspect.getsource(part).encode())
+        for section in sections or sorted(self.config):
+            digest.update(repr((section, self.config.get(section))).encode())
+        return digest.hexdigest()
+
+
+def merge(total, filled):
+    """
+    Add the filled histograms `filled` into `total` (both {name: {'sumw': ..., 'sumw2': ...}}), returning `total`.
+    A sum missing from either side (such as 'variations' of a chunk without weights) counts as zero.
+    """
+    for name, sums in filled.items():
+        current = total.get(name, {})
+        total[name] = {key: np.asarray(current.get(key, 0.0)) + np.asarray(sums.get(key, 0.0))
+                       for key in {**current, **sums}}
+    return total
+
+
+def systematic_uncertainty(nominal, variations, names):
+    """
+    Per-bin systematic uncertainty from histograms filled with each variation. Variations named
+    <source>_up and <source>_down (or a lone <source>) count as one source, taking the larger shift;
+    sources add in quadrature.
+    """
+    shifts = {}
+    for name, varied in zip(names, variations):
+        source = name.removesuffix('_up').removesuffix('_down')
+        shifts[source] = np.maximum(shifts.get(source, 0), np.abs(varied - nominal))
+    return np.sqrt(sum(shift**2 for shift in shifts.values())) if shifts else np.zeros_like(nominal)
+
+
+def load(path=ANALYSIS_CONFIG):
+    """
+    Compile the analysis description at `path`.
+    """
+    with open(path, 'rb') as f:
+        return Plan(tomllib.load(f))
+
+
+PLAN = load()
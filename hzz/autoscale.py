@@ -0,0 +1,83 @@
+"""
+Sizing of the worker pool from the data_chunks backlog.
+
+The controller in Kubernetes/autoscaler.py feeds this with the queue depth and
+the measured per-worker throughput; benchmarks/autoscale_sim.py replays a
+synthetic backlog through the same logic.
+"""
+import json
+import math
+import os
+import urllib.parse
+import urllib.request
+from collections import deque
+
+
+class Autoscaler:
+    """
+    Chooses a replica count that drains the backlog within `target_drain_seconds`.
+
+    Scaling up is immediate. Scaling down uses the highest recommendation over the last
+    `scale_down_window` seconds, so a brief dip in the backlog doesn't kill busy workers.
+    """
+
+    def __init__(self, min_replicas=1, max_replicas=10, target_drain_seconds=60,
+                 scale_down_window=120, default_rate=0.5):
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.target_drain_seconds = target_drain_seconds
+        self.scale_down_window = scale_down_window
+        self.default_rate = default_rate  # chunks/s per worker before any throughput is measured
+        self.recommendations = deque()
+
+    def recommend(self, queue_depth, per_worker_rate):
+        """
+        Replicas needed right now, ignoring stabilisation.
+        """
+        rate = per_worker_rate if per_worker_rate and per_worker_rate > 0 else self.default_rate
+        desired = math.ceil(queue_depth / (rate * self.target_drain_seconds))
+        return max(self.min_replicas, min(self.max_replicas, desired))
+
+    def desired_replicas(self, now, queue_depth, per_worker_rate, current_replicas):
+        """
+        Replica count to apply at time `now` (seconds).
+        """
+        recommendation = self.recommend(queue_depth, per_worker_rate)
+
+        self.recommendations.append((now, recommendation))
+        while self.recommendations and self.recommendations[0][0] < now - self.scale_down_window:
+            self.recommendations.popleft()
+
+        if recommendation >= current_replicas:
+            return recommendation
+        return max(r for _, r in self.recommendations)
+
+
+def queue_stats(management_url, queue, user, password):
+    """
+    Depth, consumer count and ack rate (messages/s) of `queue` from the RabbitMQ management API.
+    """
+    url = f"{management_url}/api/queues/{urllib.parse.quote('/', safe='')}/{queue}"
+    request = urllib.request.Request(url)
+    password_manager = urllib.request.HTTPPasswordMgrWithDefaultRealm()
+    password_manager.add_password(None, management_url, user, password)
+    opener = urllib.request.build_opener(urllib.request.HTTPBasicAuthHandler(password_manager))
+
+    with opener.open(request, timeout=10) as response:
+        stats = json.load(response)
+
+    ack_rate = stats.get('message_stats', {}).get('ack_details', {}).get('rate', 0.0)
+    return stats.get('messages', 0), stats.get('consumers', 0), ack_rate
+
+
+def from_env():
+    """
+    Autoscaler configured from AUTOSCALE_* environment variables.
+    """
+    return Autoscaler(
+        min_replicas=int(os.getenv("AUTOSCALE_MIN_REPLICAS", "1")),
+        max_replicas=int(os.getenv("AUTOSCALE_MAX_REPLICAS", "10")),
+        target_drain_seconds=float(os.getenv("AUTOSCALE_TARGET_DRAIN_SECONDS", "60")),
+        scale_down_window=float(os.getenv("AUTOSCALE_SCALE_DOWN_WINDOW", "120")),
+        default_rate=float(os.getenv("AUTOSCALE_DEFAULT_RATE", "0.5")),
+    )
@@ -0,0 +1,4 @@
+"""
+Transports that move chunks between the loader, worker and aggregator stages:
+local (in-process), volume (shared filesystem) and rabbitmq (message broker).
+"""
@@ -0,0 +1,92 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .. import metrics, skim
+from ..analysis import PLAN, merge
+from ..cache import process_cached
+from ..constants import DATA_PATH, samples
+from ..histogram import plot_all
+from ..loader import chunk_ranges, read_chunk
+
+
+def work(val, idx, path, entry_start, entry_stop):
+    """
+    Worker stage: read one entry range, process it and fill the plan's histograms from it.
+    """
+    chunk_metrics = metrics.chunk('local', val=val, idx=idx)
+
+    def read():
+        with chunk_metrics.stage('decode'):
+            data = read_chunk(path, entry_start, entry_stop)
+        chunk_metrics.count(bytes_in=data.nbytes)
+        return data
+
+    # Read and processed only when not in the result cache (RESULT_CACHE)
+    data = process_cached(val, path, entry_start, entry_stop, read, chunk_metrics)
+    # Skim mode: keep the selected events for later runs (see hzz.skim)
+    if skim.SKIM_OUTPUT:
+        with chunk_metrics.stage('skim'):
+            skim.write(val, entry_start, entry_stop, data)
+    # Every histogram is filled here, in the same pass, so only the sums go back to the aggregator stage
+    histograms = PLAN.fill(data, chunk_metrics=chunk_metrics)
+    chunk_metrics.count(bytes_out=data.nbytes)
+    chunk_metrics.emit()
+    return histograms
+
+
+def run(step_size=None, data_path=DATA_PATH, fraction=1.0, max_workers=1):
+    """
+    Run the loader, worker and aggregator stages in this process.
+    With max_workers > 1 (or None for one per CPU) chunks are processed by a
+    ProcessPoolExecutor, each worker process reading its own entry range.
+    step_size=None sizes the chunks of each file adaptively (see hzz.chunking).
+    Returns the filled histograms of each sample: {sample: {name: sums}}.
+    """
+    filled = {key: {} for key in samples.keys()}
+
+    # start the clock
+    start = time.time()
+
+    if max_workers == 1:
+        # Loop over samples
+        for s in samples:
+            # Print which sample is being processed
+            print('Processing '+s+' samples')
+            for val, idx, path, entry_start, entry_stop in chunk_ranges(s, step_size, data_path, fraction):
+                print(f"\t{val}-{idx}:")
+                merge(filled[s], work(val, idx, path, entry_start, entry_stop))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # Loader stage: submit every chunk up front, futures kept in submission order
+            futures = [(s, executor.submit(work, val, idx, path, entry_start, entry_stop))
+                       for s in samples
+                       for val, idx, path, entry_start, entry_stop in chunk_ranges(s, step_size, data_path, fraction)]
+
+            # Aggregator stage
+            for s, future in futures:
+                merge(filled[s], future.result())
+
+    elapsed = time.time() - start # time taken to process
+    print("Processed all samples in "+str(round(elapsed,1))+"s")
+
+    if metrics.METRICS_DIR:
+        metrics.print_summary(metrics.summarize(metrics.load(metrics.METRICS_DIR)))
+
+    return filled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the full analysis in a single process pool, without a broker.")
+    parser.add_argument("--data-path", default=DATA_PATH, help="directory or URL containing Data/ and MC/ ROOT files")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="events per chunk (default: sized per file)")
+    parser.add_argument("--output", default="4lep_invariant_mass.png", help="where to save the main plot; the others are saved next to it")
+    args = parser.parse_args()
+
+    filled = run(step_size=args.chunk_size, data_path=args.data_path, max_workers=args.workers)
+    plot_all(filled, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+import os
+import threading
+import time
+from functools import partial
+
+import pika
+
+from .. import blobstore, serialization
+from ..scheduling import MAX_PRIORITY
+
+# RabbitMQ setup
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
+credentials = pika.PlainCredentials(os.getenv("RABBITMQ_USER", "user"), os.getenv("RABBITMQ_PASSWORD", "password"))
+parameters = pika.ConnectionParameters(RABBITMQ_HOST, 5672, '/', credentials)
+
+QUEUE_NAME = "data_chunks"
+RESULTS_QUEUE = "processed_chunks"
+
+# Declared identically by every service: chunks are delivered by message priority (see hzz.scheduling)
+QUEUE_ARGUMENTS = {QUEUE_NAME: {'x-max-priority': MAX_PRIORITY}}
+
+# Chunks that fail go back to data_chunks through the retry exchange, waiting RETRY_BASE_SECONDS * 2^(n-1)
+# after the n-th failure, and to the dead-letter queue once they have failed CHUNK_MAX_ATTEMPTS times
+RETRY_EXCHANGE = "data_chunks.retry"
+DEAD_LETTER_QUEUE = "data_chunks.dead"
+CHUNK_MAX_ATTEMPTS = int(os.getenv("CHUNK_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "5"))
+
+# Bodies larger than this go to the blob store and the message carries only a reference (claim check)
+BLOB_THRESHOLD = int(os.getenv("BLOB_THRESHOLD", str(1024 * 1024)))
+blob_store = blobstore.from_env()
+
+# Confirmed publishing (ConfirmPublisher): unconfirmed messages allowed in flight, and publishes per hand-off
+PUBLISH_WINDOW = int(os.getenv("PUBLISH_WINDOW", "256"))
+PUBLISH_BATCH = int(os.getenv("PUBLISH_BATCH", "32"))
+
+
+def connect(queues, max_retries=20, retry_delay=5):
+    """
+    Connect to RabbitMQ, retrying while the broker starts up, and declare `queues`.
+    Returns (connection, channel).
+    """
+    for attempt in range(max_retries):
+        try:
+            connection = pika.BlockingConnection(parameters)
+            channel = connection.channel()
+            print("Connected to RabbitMQ")
+            for queue in queues:
+                channel.queue_declare(queue=queue, durable=True, arguments=QUEUE_ARGUMENTS.get(queue))
+            if QUEUE_NAME in queues:
+                declare_retry_queues(channel)
+            return connection, channel
+        except pika.exceptions.AMQPConnectionError as e:
+            print(f"Attempt {attempt + 1}/{max_retries} failed: {e}")
+            time.sleep(retry_delay)
+
+    print("Failed to connect to RabbitMQ after several attempts")
+    exit(1)
+
+
+def publish_body(channel, queue, body, headers=None, content_encoding=None, priority=None):
+    """
+    Publish an already serialized message body to RabbitMQ, with optional AMQP headers.
+    `content_encoding` names the compression already applied to `body`, if any.
+    `priority` only has an effect on queues declared with x-max-priority.
+    Large bodies are written to the blob store and replaced by its key and checksum.
+    """
+    if blob_store is not None and len(body) > BLOB_THRESHOLD:
+        key, checksum = blob_store.put(body)
+        headers = dict(headers or {}, claim_check=key, sha256=checksum)
+        body = b''
+
+    if content_encoding in (None, 'identity'):
+        content_encoding = None
+    properties = pika.BasicProperties(headers=headers, content_encoding=content_encoding,
+                                      delivery_mode=pika.DeliveryMode.Persistent, priority=priority)
+    channel.basic_publish(exchange='', routing_key=queue, body=body, properties=properties)
+
+
+class ConfirmPublisher:
+    """
+    Publishes in confirm mode without waiting for each confirm.
+
+    A SelectConnection runs its I/O loop in a background thread. `basic_publish` queues
+    the message and returns at once. Queued messages reach the I/O thread in batches of
+    `batch_size`. At most `window` messages are unconfirmed at a time, so a broker that
+    stops confirming (e.g. under a memory alarm) blocks the caller instead of losing
+    chunks. Nacked messages are published again. Stands in for a BlockingChannel in
+    `publish_body` and `publish_message`.
+    """
+
+    def __init__(self, queues, window=PUBLISH_WINDOW, batch_size=PUBLISH_BATCH, timeout=60):
+        self.queues = list(queues)
+        self.window = window
+        self.in_flight = 0  # published or queued, not yet confirmed
+        self.batch_size = batch_size
+        self.batch = []  # (queue, body, properties) not yet handed to the I/O thread
+        self.unconfirmed = {}  # delivery tag -> (queue, body, properties), touched only by the I/O thread
+        self.delivery_tag = 0
+        self.confirmed = threading.Condition()
+        self.ready = threading.Event()
+        self.error = None
+        self.channel = None
+
+        self.connection = pika.SelectConnection(parameters, on_open_callback=self._on_connection_open,
+                                                on_open_error_callback=self._on_connection_closed,
+                                                on_close_callback=self._on_connection_closed)
+        self.thread = threading.Thread(target=self.connection.ioloop.start, name='confirm-publisher', daemon=True)
+        self.thread.start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError("RabbitMQ channel did not open in confirm mode")
+        self._check()
+
+    # I/O thread
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_closed(self, connection, error):
+        self.error = self.error or error
+        self.ready.set()
+        with self.confirmed:
+            self.confirmed.notify_all()
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self.channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        self._declare(list(self.queues))
+
+    def _on_channel_closed(self, channel, error):
+        # The broker closes just the channel on a failed operation (e.g. declaring a deleted queue passively),
+        # which leaves nothing to publish on: fail the waiting caller and close the connection too
+        self.error = self.error or error
+        self.ready.set()
+        with self.confirmed:
+            self.confirmed.notify_all()
+        if self.connection.is_open:
+            self.connection.close()
+
+    def _declare(self, queues, frame=None):
+        if queues:
+            self.channel.queue_declare(queues[0], durable=True, arguments=QUEUE_ARGUMENTS.get(queues[0]),
+                                       callback=partial(self._declare, queues[1:]))
+        else:
+            self.channel.confirm_delivery(self._on_confirm, callback=lambda frame: self.ready.set())
+
+    def _publish(self, messages):
+        for queue, body, properties in messages:
+            self.channel.basic_publish(exchange='', routing_key=queue, body=body, properties=properties)
+            # In confirm mode the broker numbers the channel's publishes 1, 2, 3, ...
+            self.delivery_tag += 1
+            self.unconfirmed[self.delivery_tag] = (queue, body, properties)
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        if method.multiple:
+            tags = [tag for tag in self.unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        messages = [self.unconfirmed.pop(tag) for tag in tags if tag in self.unconfirmed]
+
+        if isinstance(method, pika.spec.Basic.Nack):
+            # The broker could not take the messages: send them again, still counted as in flight
+            print(f"Broker nacked {len(messages)} message(s), republishing")
+            self._publish(messages)
+            return
+
+        with self.confirmed:
+            self.in_flight -= len(messages)
+            self.confirmed.notify_all()
+
+    # Caller thread
+
+    def _check(self):
+        if self.error is not None:
+            raise pika.exceptions.AMQPConnectionError(self.error)
+
+    def _send_batch(self):
+        if self.batch:
+            batch, self.batch = self.batch, []
+            self.connection.ioloop.add_callback_threadsafe(partial(self._publish, batch))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self._check()
+        with self.confirmed:
+            if self.in_flight >= self.window:
+                # Window full: hand over what is queued so its confirms can free slots, then wait for one
+                self._send_batch()
+                while self.in_flight >= self.window:
+                    self.confirmed.wait(timeout=1)
+                    self._check()
+            self.in_flight += 1
+        self.batch.append((routing_key, body, properties))
+        if len(self.batch) >= self.batch_size:
+            self._send_batch()
+
+    def queue_depth(self, queue):
+        """
+        Messages waiting in `queue` (a passive queue_declare), plus those of ours not yet confirmed.
+        """
+        self._check()
+        # Queued messages only count down once sent and confirmed
+        self._send_batch()
+        declared = {}
+        done = threading.Event()
+
+        def on_declared(frame):
+            declared['message_count'] = frame.method.message_count
+            done.set()
+
+        self.connection.ioloop.add_callback_threadsafe(
+            lambda: self.channel.queue_declare(queue, passive=True, callback=on_declared))
+        while not done.wait(timeout=1):
+            self._check()
+        return declared['message_count'] + self.in_flight
+
+    def flush(self):
+        """
+        Send any queued messages and wait until the broker has confirmed all of them.
+        """
+        self._send_batch()
+        with self.confirmed:
+            while self.in_flight:
+                self._check()
+                self.confirmed.wait(timeout=1)
+
+    def close(self):
+        self.flush()
+        self.connection.ioloop.add_callback_threadsafe(self.connection.close)
+        self.thread.join()
+
+
+def declare_retry_queues(channel):
+    """
+    Declare the retry exchange, with one delay queue per retry that dead-letters back into
+    data_chunks once its TTL expires, and the dead-letter queue for chunks that keep failing.
+    """
+    channel.exchange_declare(exchange=RETRY_EXCHANGE, exchange_type='direct', durable=True)
+    for failures in range(1, CHUNK_MAX_ATTEMPTS):
+        # One queue per delay, since RabbitMQ only expires messages at the head of a queue
+        queue = f"{RETRY_EXCHANGE}.{failures}"
+        channel.queue_declare(queue=queue, durable=True, arguments={
+            'x-message-ttl': int(RETRY_BASE_SECONDS * 2 ** (failures - 1) * 1000),
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': QUEUE_NAME,
+        })
+        channel.queue_bind(queue=queue, exchange=RETRY_EXCHANGE, routing_key=str(failures))
+    channel.queue_declare(queue=DEAD_LETTER_QUEUE, durable=True)
+
+
+def pending_retries(channel):
+    """
+    Number of failed chunks waiting in the retry delay queues to go back into data_chunks.
+    """
+    return sum(channel.queue_declare(f"{RETRY_EXCHANGE}.{failures}", passive=True).method.message_count
+               for failures in range(1, CHUNK_MAX_ATTEMPTS))
+
+
+def retry_or_dead_letter(channel, properties, body, error):
+    """
+    Publish a message that failed to process again after a delay, or to the dead-letter queue
+    once it has failed CHUNK_MAX_ATTEMPTS times. `body` is the message as received; the failure
+    count travels in the 'attempts' header. Returns the number of failures so far.
+    """
+    headers = (properties.headers if properties is not None else None) or {}
+    failures = headers.get('attempts', 0) + 1
+    retry_properties = pika.BasicProperties(
+        headers=dict(headers, attempts=failures, error=str(error)[:1000]),
+        content_encoding=properties.content_encoding if properties is not None else None,
+        priority=properties.priority if properties is not None else None,
+        delivery_mode=pika.DeliveryMode.Persistent)
+
+    if failures >= CHUNK_MAX_ATTEMPTS:
+        channel.basic_publish(exchange='', routing_key=DEAD_LETTER_QUEUE, body=body, properties=retry_properties)
+    else:
+        channel.basic_publish(exchange=RETRY_EXCHANGE, routing_key=str(failures), body=body,
+                              properties=retry_properties)
+    return failures
+
+
+def connect_publisher(queues, max_retries=20, retry_delay=5):
+    """
+    Open a ConfirmPublisher declaring `queues`, retrying while the broker starts up.
+    """
+    for attempt in range(max_retries):
+        try:
+            publisher = ConfirmPublisher(queues)
+            print("Connected to RabbitMQ (publisher confirms)")
+            return publisher
+        except (pika.exceptions.AMQPConnectionError, TimeoutError) as e:
+            print(f"Attempt {attempt + 1}/{max_retries} failed: {e}")
+            time.sleep(retry_delay)
+
+    print("Failed to connect to RabbitMQ after several attempts")
+    exit(1)
+
+
+def chunk_identity(properties):
+    """
+    Run, file and chunk index a chunk message was published with, readable even if its body is not.
+    """
+    headers = (properties.headers if properties is not None else None) or {}
+    return {field: headers.get(field) for field in ('run', 'val', 'idx')}
+
+
+def claim_check(properties):
+    """
+    Blob key of an offloaded message, or None if the body was sent inline.
+    """
+    return ((properties.headers if properties is not None else None) or {}).get('claim_check')
+
+
+def input_claim_check(properties):
+    """
+    Blob key of the offloaded input chunk a result was computed from, or None.
+    """
+    return ((properties.headers if properties is not None else None) or {}).get('input_claim_check')
+
+
+def body_encoding(properties):
+    """
+    Compression applied to a received body, 'identity' if none.
+    """
+    return (properties.content_encoding if properties is not None else None) or 'identity'
+
+
+def receive_body(properties, body):
+    """
+    Body of a received message, fetched from the blob store if it was offloaded.
+    The body is still compressed; see serialization.decompress.
+    """
+    key = claim_check(properties)
+    if key is None:
+        return body
+    return blob_store.get(key, properties.headers['sha256'])
+
+
+def delete_blobs(*keys):
+    """
+    Garbage collect offloaded bodies once they are no longer needed.
+    """
+    for key in keys:
+        if key:
+            blob_store.delete(key)
+
+
+def publish_message(channel, queue, message, headers=None, priority=None):
+    """
+    Publish a message to RabbitMQ, compressed with CONTENT_ENCODING.
+    """
+    body = serialization.compress(serialization.dumps(message))
+    publish_body(channel, queue, body, headers, serialization.CONTENT_ENCODING, priority)
@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+
+import awkward as ak
+
+from .. import serialization
+from ..analysis import merge
+from ..constants import samples, sample_of
+
+
+def write_atomic(data, path):
+    """
+    Write an awkward array to parquet via a temp file so readers never see a partial file.
+    """
+    temp_path = path + ".tmp"
+    ak.to_parquet(data, temp_path)
+    os.rename(temp_path, path)
+
+
+def write_histograms(histograms, path):
+    """
+    Write the histograms filled from one chunk via a temp file so readers never see a partial file.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(serialization.dumps({'histograms': histograms}))
+    os.rename(temp_path, path)
+
+
+def claim_chunk(input_dir, processing_dir):
+    """
+    Lock the first available chunk by moving it into `processing_dir`.
+    Returns the chunk file name, or None if there is nothing to process.
+    """
+    for chunk_file in os.listdir(input_dir):
+        if not chunk_file.endswith(".awkd"):
+            continue
+        try:
+            shutil.move(os.path.join(input_dir, chunk_file), os.path.join(processing_dir, chunk_file))
+        except FileNotFoundError:
+            # Another worker claimed this chunk first
+            continue
+        return chunk_file
+    return None
+
+
+def chunk_val(chunk_file):
+    """
+    File name (e.g. 'Zee') of a chunk named like 'Zee-3.awkd'.
+    """
+    return os.path.basename(chunk_file).rsplit('-', 1)[0]
+
+
+def write_manifest(manifest_path, chunks):
+    """
+    Atomically write the list of expected chunk names.
+    """
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump({'chunks': chunks}, f)
+    os.rename(manifest_path + ".tmp", manifest_path)
+
+
+def missing_chunks(manifest_path, processed_dir):
+    """
+    Return the chunks from the loader manifest that have no processed file yet,
+    or None if the loader has not written the manifest.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as f:
+        expected = json.load(f)['chunks']
+
+    processed = set(os.listdir(processed_dir)) if os.path.isdir(processed_dir) else set()
+    return [chunk for chunk in expected if f"processed-{chunk}" not in processed]
+
+
+def load_results(processed_dir):
+    """
+    Load the histograms of all processed chunks and add them up by sample key: {sample: {name: sums}}.
+    """
+    filled = {key: {} for key in samples.keys()}
+
+    for file in os.listdir(processed_dir):
+        if not file.startswith("processed-") or not file.endswith(".awkd"):
+            continue
+        # E.g. "processed-Zee-0.awkd"
+        val = chunk_val(file[len("processed-"):])
+        with open(os.path.join(processed_dir, file), "rb") as f:
+            merge(filled[sample_of(val)], serialization.loads(f.read())['histograms'])
+
+    return filled
@@ -0,0 +1,108 @@
+"""
+Blob storage for message bodies too large to send through RabbitMQ.
+
+BLOB_STORE selects the store: a directory shared by all services (e.g. a
+volume mounted at /blobs), or s3://bucket for MinIO or any S3-compatible
+service reached through BLOB_STORE_ENDPOINT. Unset disables offloading.
+"""
+import hashlib
+import os
+import uuid
+
+BLOB_STORE = os.getenv("BLOB_STORE")
+BLOB_STORE_ENDPOINT = os.getenv("BLOB_STORE_ENDPOINT")
+
+
+class BlobMissing(Exception):
+    """
+    The blob was already garbage collected, or never written.
+    """
+
+
+class ChecksumMismatch(Exception):
+    """
+    The blob read back does not match the checksum sent with the message.
+    """
+
+
+def checksum(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def verify(body, expected):
+    if checksum(body) != expected:
+        raise ChecksumMismatch(f"Blob checksum {checksum(body)} does not match {expected}")
+    return body
+
+
+class FilesystemBlobStore:
+    """
+    Blobs as files in a directory shared by every service.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, body):
+        """
+        Store `body`. Returns (key, sha256 checksum).
+        """
+        key = uuid.uuid4().hex
+        path = os.path.join(self.root, key)
+        # Write to a temp file first so readers never see a partial blob
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.rename(path + ".tmp", path)
+        return key, checksum(body)
+
+    def get(self, key, expected_checksum):
+        try:
+            with open(os.path.join(self.root, key), "rb") as f:
+                return verify(f.read(), expected_checksum)
+        except FileNotFoundError:
+            raise BlobMissing(key)
+
+    def delete(self, key):
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore:
+    """
+    Blobs as objects in an S3-compatible bucket (MinIO in a local setup).
+    """
+
+    def __init__(self, bucket, endpoint_url=None):
+        import boto3
+
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def put(self, body):
+        key = uuid.uuid4().hex
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body)
+        return key, checksum(body)
+
+    def get(self, key, expected_checksum):
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            raise BlobMissing(key)
+        return verify(body, expected_checksum)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+def from_env():
+    """
+    Blob store configured by BLOB_STORE, or None when offloading is disabled.
+    """
+    if not BLOB_STORE:
+        return None
+    if BLOB_STORE.startswith("s3://"):
+        return S3BlobStore(BLOB_STORE[len("s3://"):], BLOB_STORE_ENDPOINT)
+    return FilesystemBlobStore(BLOB_STORE)
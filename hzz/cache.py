@@ -0,0 +1,122 @@
+"""
+On-disk cache of processed chunks, so repeat runs skip work that is unchanged.
+
+Entries are keyed on the input file's identity, the chunk's entry range and
+a hash of the analysis code and plan (hzz/analysis.toml) of each stage.
+Selected events (cuts) and final results (derived quantities and weights)
+are cached separately. Changing only the weights reruns only the second
+stage, starting from the cached selection. RESULT_CACHE names the cache
+directory; unset disables caching.
+"""
+import hashlib
+import inspect
+import os
+import uuid
+
+import awkward as ak
+
+from . import infofile, metrics
+from .analysis import PLAN, Plan
+from .selection import derive, process_chunk, select_events
+from .weights import calc_weight, calc_weights
+
+RESULT_CACHE = os.getenv("RESULT_CACHE")
+
+
+def code_hash(*parts):
+    """
+    Hash of the source of the functions in `parts` and the repr of everything else.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((inspect.getsource(part) if callable(part) else repr(part)).encode())
+    return digest.hexdigest()
+
+
+# What each stage's output depends on besides its input: the selection stores every branch the plan reads.
+# Histogram binning and labels only enter the fill, which is never cached, so changing them reruns nothing.
+SELECT_HASH = code_hash(PLAN.branches, PLAN.fingerprint('cuts', 'derived'), select_events, Plan.select)
+DERIVE_HASH = code_hash(SELECT_HASH, PLAN.fingerprint('derived', 'weight', 'variations', 'lumi'),
+                        derive, Plan.derive, Plan.weigh, calc_weight, calc_weights)
+
+
+def file_identity(path):
+    """
+    Local files are identified by path, size and modification time. Remote files are
+    identified by URL alone, since published samples do not change.
+    """
+    if os.path.exists(path):
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return path
+
+
+def chunk_keys(val, path, entry_start, entry_stop):
+    """
+    Cache keys of the selected events and of the final result of one chunk.
+    """
+    chunk = f"{file_identity(path)}:{entry_start}:{entry_stop}"
+    return {
+        'select': hashlib.sha256(f"{chunk}:{SELECT_HASH}".encode()).hexdigest(),
+        # The per-file cross-section metadata only enters the weights
+        'result': hashlib.sha256(f"{chunk}:{DERIVE_HASH}:{infofile.infos.get(val)!r}".encode()).hexdigest(),
+    }
+
+
+class ResultCache:
+    """
+    Awkward arrays stored as parquet files under `directory`/<stage>/.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, stage, key):
+        return os.path.join(self.directory, stage, key[:2], key + ".parquet")
+
+    def get(self, stage, key):
+        path = self.path(stage, key)
+        if not os.path.exists(path):
+            return None
+        return ak.from_parquet(path)
+
+    def put(self, stage, key, array):
+        path = self.path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a unique name and rename, so concurrent workers never read half a file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        ak.to_parquet(array, tmp_path)
+        os.replace(tmp_path, path)
+
+
+default = ResultCache(RESULT_CACHE) if RESULT_CACHE else None
+
+
+def process_cached(val, path, entry_start, entry_stop, read, chunk_metrics=metrics.NULL, cache=None):
+    """
+    Processed events of one chunk, reusing cached stages when this input and code were processed before.
+    `read` returns the chunk's input events and is only called when the selection is not cached.
+    """
+    cache = cache or default
+    if cache is None:
+        return process_chunk(read(), val, chunk_metrics)
+
+    keys = chunk_keys(val, path, entry_start, entry_stop)
+    result = cache.get('result', keys['result'])
+    if result is not None:
+        chunk_metrics.count(cache='result', events_out=len(result))
+        return result
+
+    selected = cache.get('select', keys['select'])
+    if selected is None:
+        data = read()
+        chunk_metrics.count(cache='miss', events_in=len(data))
+        selected = select_events(data, chunk_metrics)
+        cache.put('select', keys['select'], selected)
+    else:
+        chunk_metrics.count(cache='select')
+
+    result = derive(selected, val, chunk_metrics)
+    cache.put('result', keys['result'], result)
+    chunk_metrics.count(events_out=len(result))
+    return result
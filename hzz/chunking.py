@@ -0,0 +1,117 @@
+"""
+Entries-per-chunk chosen per file instead of a fixed number of events.
+
+The size is the smaller of what fits in CHUNK_TARGET_BYTES of decoded branch
+data (from the branch sizes uproot reports, without reading any events) and
+what a worker should get through in CHUNK_TARGET_SECONDS, using the measured
+seconds per event of that file from earlier runs. The measured costs come from
+the per-chunk metrics (hzz.metrics):
+
+    python -m hzz.chunking $HZZ_METRICS_DIR --output chunk_costs.json
+    CHUNK_COSTS=chunk_costs.json python loader.py
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from .metrics import METRICS_DIR, load
+
+CHUNK_TARGET_BYTES = int(os.getenv("CHUNK_TARGET_BYTES", str(16 * 1024 * 1024)))
+CHUNK_TARGET_SECONDS = float(os.getenv("CHUNK_TARGET_SECONDS", "2"))
+CHUNK_MIN_ENTRIES = int(os.getenv("CHUNK_MIN_ENTRIES", "10000"))
+CHUNK_MAX_ENTRIES = int(os.getenv("CHUNK_MAX_ENTRIES", "1000000"))
+CHUNK_COSTS = os.getenv("CHUNK_COSTS")
+COST_SERVICES = ("worker", "local")  # services whose records time processing input events
+
+
+def bytes_per_entry(tree, branches):
+    """
+    Average decoded size of one entry of `branches`, from the branch metadata.
+    """
+    return sum(tree[branch].uncompressed_bytes for branch in branches) / max(tree.num_entries, 1)
+
+
+def costs_from_metrics(records):
+    """
+    Median worker seconds per input event for each file name, from hzz.metrics records.
+    Only records of the services that process chunks count: the aggregator's, for one, time decoding results
+    and count selected events.
+    """
+    per_event = {}
+    for record in records:
+        if record.get('service') in COST_SERVICES and record.get('events_in') and 'val' in record:
+            per_event.setdefault(record['val'], []).append(record['elapsed'] / record['events_in'])
+    return {val: float(np.median(costs)) for val, costs in per_event.items()}
+
+
+def load_costs():
+    """
+    Measured seconds per event by file name, from CHUNK_COSTS or else the metrics directory.
+    """
+    if CHUNK_COSTS and os.path.exists(CHUNK_COSTS):
+        with open(CHUNK_COSTS) as f:
+            return json.load(f)
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        return costs_from_metrics(load(METRICS_DIR))
+    return {}
+
+
+def entries_per_chunk(tree, branches, val, costs=None,
+                      target_bytes=CHUNK_TARGET_BYTES, target_seconds=CHUNK_TARGET_SECONDS,
+                      min_entries=CHUNK_MIN_ENTRIES, max_entries=CHUNK_MAX_ENTRIES):
+    """
+    Entries per chunk for file `val` so a chunk stays within both the bytes and the time budget.
+    """
+    entries = target_bytes / max(bytes_per_entry(tree, branches), 1)
+
+    seconds_per_event = (costs or {}).get(val)
+    if seconds_per_event:
+        entries = min(entries, target_seconds / seconds_per_event)
+
+    entries = int(max(min_entries, min(max_entries, entries)))
+    return max(1, min(entries, tree.num_entries))
+
+
+def chunk_boundaries(tree, branches, target_entries, entry_stop=None):
+    """
+    Split [0, entry_stop) into (entry_start, entry_stop) ranges of about `target_entries`,
+    cutting only where every branch in `branches` starts a new basket. Each basket then
+    belongs to exactly one chunk and is decompressed once.
+    """
+    entry_stop = tree.num_entries if entry_stop is None else min(entry_stop, tree.num_entries)
+    offsets = [offset for offset in tree.common_entry_offsets(filter_name=branches) if offset < entry_stop]
+    offsets.append(entry_stop)
+
+    boundaries = []
+    start = last = 0
+    for offset in offsets[1:]:
+        # Cut at the previous basket boundary if it is closer to the target than this one
+        if offset - start >= target_entries and last > start and target_entries - (last - start) < offset - start - target_entries:
+            boundaries.append((start, last))
+            start = last
+        if offset - start >= target_entries:
+            boundaries.append((start, offset))
+            start = offset
+        last = offset
+
+    if start < entry_stop:
+        boundaries.append((start, entry_stop))
+    return boundaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derive per-file seconds per event from chunk metrics.")
+    parser.add_argument("directory", nargs="?", default=METRICS_DIR)
+    parser.add_argument("--output", default="chunk_costs.json")
+    args = parser.parse_args()
+
+    costs = costs_from_metrics(load(args.directory))
+    with open(args.output, "w") as f:
+        json.dump(costs, f, indent=2)
+    print(f"Wrote costs for {len(costs)} files to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
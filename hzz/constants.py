@@ -1,4 +1,9 @@
+import os
 
+# Where the 4lep ROOT files live, override with a local directory to run offline
+DATA_PATH = os.getenv("DATA_PATH", "https://atlas-opendata.web.cern.ch/atlas-opendata/samples/2020/4lep/")
+
+# For identification and naming
 samples = {
 
     'data': {
@@ -22,11 +27,17 @@ samples = {
 
 }
 
-variables = ['lep_pt', 'lep_eta', 'lep_phi', 'lep_E', 'lep_charge', 'lep_type']
-weight_variables = ["mcWeight", "scaleFactor_PILEUP", "scaleFactor_ELE", "scaleFactor_MUON", "scaleFactor_LepTRIGGER"]
-
-lumi = 10  # Integrated luminosity in fb^-1
-fraction = 1.0  # Fraction of luminosity used
+SIGNAL = r'Signal ($m_H$ = 125 GeV)'
 
 MeV = 0.001
-GeV = 1.0
\ No newline at end of file
+GeV = 1.0
+
+
+def sample_of(val):
+    """
+    Return the sample key (e.g. 'data') that a file name such as 'data_A' belongs to.
+    """
+    for sample, sample_info in samples.items():
+        if val in sample_info['list']:
+            return sample
+    raise KeyError(f"Unknown sample file {val}")
@@ -0,0 +1,103 @@
+"""
+Count-only cutflow of the whole dataset: events and weighted yields of each
+sample before the cuts and after each one, in the order of hzz/analysis.toml.
+
+Only the branches the cuts and weights need are read (lep_type, lep_charge
+and the weight factors for the default plan). No kinematics are computed, and
+each chunk returns only its counters, so this runs in a fraction of the time
+of the full analysis:
+
+    python -m hzz.cutflow --data-path fixtures/ --workers 4 --output cutflow.json
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .analysis import PLAN
+from .constants import DATA_PATH, samples
+from .loader import chunk_ranges, read_chunk
+from .weights import calc_weight
+
+
+def count_chunk(val, path, entry_start, entry_stop):
+    """
+    Cutflow rows of one entry range: [(cut, events, weighted)].
+    """
+    data = read_chunk(path, entry_start, entry_stop, PLAN.cutflow_branches)
+    # Data is counted with unit weights
+    if 'data' not in val:
+        weights = np.asarray(calc_weight(PLAN.weight_factors, val, data, PLAN.lumi), dtype=np.float64)
+    else:
+        weights = np.ones(len(data))
+    return PLAN.cutflow(data, weights)
+
+
+def add(table, rows):
+    """
+    Add the rows of one chunk into a sample's table ({cut: {'events': n, 'weighted': w}}), returning it.
+    """
+    for cut, events, weighted in rows:
+        entry = table.setdefault(cut, {'events': 0, 'weighted': 0.0})
+        entry['events'] += events
+        entry['weighted'] += weighted
+    return table
+
+
+def run(step_size=None, data_path=DATA_PATH, fraction=1.0, max_workers=1):
+    """
+    Cutflow table of every sample: {sample: {cut: {'events': n, 'weighted': w}}}.
+    With max_workers > 1 (or None for one per CPU) chunks are counted in a ProcessPoolExecutor.
+    """
+    tables = {s: {} for s in samples}
+    start = time.time()
+
+    chunks = [(s, val, path, entry_start, entry_stop)
+              for s in samples
+              for val, idx, path, entry_start, entry_stop in chunk_ranges(s, step_size, data_path, fraction)]
+    if max_workers == 1:
+        for s, *chunk in chunks:
+            add(tables[s], count_chunk(*chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [(s, executor.submit(count_chunk, *chunk)) for s, *chunk in chunks]
+            for s, future in futures:
+                add(tables[s], future.result())
+
+    print(f"Counted {len(chunks)} chunks in {time.time() - start:.1f}s")
+    return tables
+
+
+def print_tables(tables):
+    for sample, table in tables.items():
+        print(f"\n{sample}")
+        print(f"{'cut':<16}{'events':>12}{'weighted':>16}{'efficiency':>12}")
+        previous = None
+        for cut, entry in table.items():
+            # Efficiency relative to the previous row
+            efficiency = 1.0 if previous is None else entry['events'] / previous if previous else 0.0
+            print(f"{cut:<16}{entry['events']:>12}{entry['weighted']:>16.4f}{efficiency:>12.1%}")
+            previous = entry['events']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count events and weighted yields after each cut, per sample.")
+    parser.add_argument("--data-path", default=DATA_PATH, help="directory or URL containing Data/ and MC/ ROOT files")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (0 for one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="events per chunk (default: sized per file)")
+    parser.add_argument("--output", help="also write the tables to this JSON file")
+    args = parser.parse_args()
+
+    tables = run(step_size=args.chunk_size, data_path=args.data_path, fraction=PLAN.fraction,
+                 max_workers=args.workers or None)
+    print_tables(tables)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(tables, f, indent=2)
+        print(f"Cutflow saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
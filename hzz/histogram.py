@@ -0,0 +1,209 @@
+import os
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.ticker import AutoMinorLocator
+
+from .analysis import PLAN, systematic_uncertainty
+from .constants import SIGNAL, samples
+
+
+def plot_path(output_path, name):
+    """
+    Where histogram `name` is saved: the main (first) histogram at `output_path`, the others next to it.
+    """
+    if name == next(iter(PLAN.histograms)):
+        return output_path
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}_{name}{ext}"
+
+
+def plot_all(filled, output_path):
+    """
+    Plot every histogram in `filled` ({sample: {name: sums}}, as filled by the workers).
+    """
+    names = [name for name in PLAN.histograms if any(name in sums for sums in filled.values())]
+    for name in names:
+        histogram = PLAN.histograms[name]
+        by_sample = {s: filled[s][name] for s in samples if name in filled.get(s, {})}
+        if len(histogram.axes) == 1:
+            plot_histogram(histogram, by_sample, plot_path(output_path, name))
+        else:
+            plot_histogram_2d(histogram, by_sample, plot_path(output_path, name))
+
+
+def empty(sums):
+    return not np.any(sums['sumw2'])
+
+
+def annotate(main_axes, histogram):
+    """
+    ATLAS Open Data, energy, luminosity and analysis labels in the top left of the plot.
+    """
+    # Add text 'ATLAS Open Data' on plot
+    plt.text(0.05, # x
+                0.93, # y
+                'ATLAS Open Data', # text
+                transform=main_axes.transAxes, # coordinate system used is that of main_axes
+                fontsize=13 )
+
+    # Add text 'for education' on plot
+    plt.text(0.05, # x
+                0.88, # y
+                'for education', # text
+                transform=main_axes.transAxes, # coordinate system used is that of main_axes
+                style='italic',
+                fontsize=8 )
+
+    # Add energy and luminosity
+    lumi_used = str(PLAN.lumi*PLAN.fraction) # luminosity to write on the plot
+    plt.text(0.05, # x
+                0.82, # y
+                r'$\sqrt{s}$=13 TeV,$\int$L dt = '+lumi_used+' fb$^{-1}$', # text
+                transform=main_axes.transAxes ) # coordinate system used is that of main_axes
+
+    # Add a label for the analysis carried out, and the decay channel if this histogram has one
+    plt.text(0.05, # x
+                0.76, # y
+                r'$H \rightarrow ZZ^* \rightarrow 4\ell$' + (f' ({histogram.channel})' if histogram.channel else ''),
+                transform=main_axes.transAxes ) # coordinate system used is that of main_axes
+
+
+def save(output_path):
+    try:
+        plt.savefig(output_path, format='png')
+        print(f"Plot saved to {output_path}")
+    except Exception as e:
+        print(f"Error saving plot: {e}")
+    plt.close()
+
+
+def plot_histogram(histogram, by_sample, output_path):
+    """
+    Plot a 1D histogram for data, stacked background MC and signal from its per-sample sums, and save to `output_path`.
+    """
+    print(f"Generating plot of {histogram.name}...")
+    zeros = {'sumw': np.zeros(histogram.shape), 'sumw2': np.zeros(histogram.shape)}
+    edges, centres = histogram.edges, histogram.centres
+
+    data_x = by_sample.get('data', zeros)['sumw'] # histogram the data
+    data_x_errors = np.sqrt( by_sample.get('data', zeros)['sumw2'] ) # statistical error on the data
+
+    mc_x = [] # define list to hold the Monte Carlo histogram heights
+    mc_x_var = np.zeros(histogram.shape) # sum of the squared Monte Carlo weights in each bin
+    mc_x_varied = np.zeros((len(PLAN.variations),) + histogram.shape) # background MC with each weight variation
+    mc_colors = [] # define list to hold the colors of the Monte Carlo bars
+    mc_labels = [] # define list to hold the legend labels of the Monte Carlo bars
+
+    for s in samples: # loop over samples
+        if s not in ['data', SIGNAL]: # if not data nor signal
+            if empty(by_sample.get(s, zeros)):
+                print(f"Skipping {s}: No data available.")
+                continue
+            mc_x.append( by_sample[s]['sumw'] ) # append to the list of Monte Carlo histogram heights
+            mc_x_var += by_sample[s]['sumw2']
+            mc_x_varied += by_sample[s].get('variations', by_sample[s]['sumw'])
+            mc_colors.append( samples[s]['color'] ) # append to the list of Monte Carlo bar colors
+            mc_labels.append( s ) # append to the list of Monte Carlo legend labels
+
+    # *************
+    # Main plot
+    # *************
+    plt.figure()
+    main_axes = plt.gca() # get current axes
+
+    # plot the data points
+    main_axes.errorbar(x=centres, y=data_x, yerr=data_x_errors,
+                        fmt='ko', # 'k' means black and 'o' is for circles
+                        label='Data')
+
+    mc_x_tot = np.zeros(len(centres))
+    if mc_x:
+        # plot the Monte Carlo bars: one entry per bin centre, weighted by the bin's height
+        mc_heights = main_axes.hist([centres] * len(mc_x), bins=edges,
+                                    weights=mc_x, stacked=True,
+                                    color=mc_colors, label=mc_labels )
+
+        mc_x_tot = mc_heights[0][-1] if len(mc_x) > 1 else mc_heights[0] # stacked background MC y-axis value
+
+        # calculate MC statistical uncertainty: sqrt(sum w^2)
+        mc_x_err = np.sqrt(mc_x_var)
+
+        # plot the statistical uncertainty
+        main_axes.bar(centres, # x
+                        2*mc_x_err, # heights
+                        alpha=0.5, # half transparency
+                        bottom=mc_x_tot-mc_x_err, color='none',
+                        hatch="////", width=histogram.step, label='Stat. Unc.' )
+
+        if PLAN.variations:
+            # statistical and systematic (weight variation) uncertainties in quadrature
+            mc_x_syst = systematic_uncertainty(mc_x_tot, mc_x_varied, list(PLAN.variations))
+            mc_x_tot_err = np.sqrt(mc_x_err**2 + mc_x_syst**2)
+            main_axes.bar(centres, 2*mc_x_tot_err, alpha=0.5, bottom=mc_x_tot-mc_x_tot_err, color='none',
+                            hatch="\\\\", width=histogram.step, label='Stat. $\\oplus$ Syst. Unc.' )
+
+    if not empty(by_sample.get(SIGNAL, zeros)):
+        # plot the signal bar
+        main_axes.hist(centres, bins=edges, bottom=mc_x_tot,
+                        weights=by_sample[SIGNAL]['sumw'], color=samples[SIGNAL]['color'],
+                        label=SIGNAL)
+
+    # set the x-limit of the main axes
+    main_axes.set_xlim( left=histogram.xmin, right=histogram.xmax )
+
+    # separation of x axis minor ticks
+    main_axes.xaxis.set_minor_locator( AutoMinorLocator() )
+
+    # set the axis tick parameters for the main axes
+    main_axes.tick_params(which='both', # ticks on both x and y axes
+                            direction='in', # Put ticks inside and outside the axes
+                            top=True, # draw ticks on the top axis
+                            right=True ) # draw ticks on right axis
+
+    # x-axis label
+    main_axes.set_xlabel(histogram.label,
+                        fontsize=13, x=1, horizontalalignment='right' )
+
+    # write y-axis label for main axes
+    main_axes.set_ylabel('Events / '+str(histogram.step)+(' '+histogram.unit if histogram.unit else ''),
+                            y=1, horizontalalignment='right')
+
+    # set y-axis limits for main axes
+    main_axes.set_ylim( bottom=0, top=max(np.amax(data_x), 1)*1.6 )
+
+    # add minor ticks on y-axis for main axes
+    main_axes.yaxis.set_minor_locator( AutoMinorLocator() )
+
+    annotate(main_axes, histogram)
+
+    # draw the legend
+    main_axes.legend( frameon=False ) # no box around the legend
+
+    save(output_path)
+
+
+def plot_histogram_2d(histogram, by_sample, output_path):
+    """
+    Plot a 2D histogram as data, total background MC and signal side by side, and save to `output_path`.
+    """
+    print(f"Generating plot of {histogram.name}...")
+    x_axis, y_axis = histogram.axes
+    panels = {
+        'Data': by_sample.get('data', {}).get('sumw', np.zeros(histogram.shape)),
+        'Background MC': sum((by_sample[s]['sumw'] for s in samples if s not in ['data', SIGNAL] and s in by_sample),
+                             np.zeros(histogram.shape)),
+        SIGNAL: by_sample.get(SIGNAL, {}).get('sumw', np.zeros(histogram.shape)),
+    }
+
+    figure, axes = plt.subplots(1, len(panels), figsize=(6 * len(panels), 5))
+    for main_axes, (title, heights) in zip(axes, panels.items()):
+        # pcolormesh wants (y, x)
+        mesh = main_axes.pcolormesh(x_axis.edges, y_axis.edges, heights.T)
+        figure.colorbar(mesh, ax=main_axes, label='Events')
+        main_axes.set_title(title)
+        main_axes.set_xlabel(x_axis.label, x=1, horizontalalignment='right')
+        main_axes.set_ylabel(y_axis.label, y=1, horizontalalignment='right')
+    figure.tight_layout()
+
+    save(output_path)
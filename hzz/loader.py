@@ -0,0 +1,81 @@
+import uproot
+
+from . import infofile, skim
+from .chunking import chunk_boundaries, entries_per_chunk, load_costs
+from .analysis import PLAN
+from .constants import DATA_PATH, samples
+
+
+def file_path(sample, val, data_path=DATA_PATH):
+    """
+    Path (or URL) of the ROOT file for file `val` of `sample`.
+    """
+    if sample == 'data':
+        prefix = "Data/"  # Data prefix
+    else:  # MC prefix
+        prefix = f"MC/mc_{infofile.infos[val]['DSID']}."
+    return data_path + prefix + val + ".4lep.root"
+
+
+def file_chunks(tree, val, step_size=None, fraction=1.0, costs=None):
+    """
+    Basket-aligned (entry_start, entry_stop) ranges of one file's tree, of about `step_size`
+    entries or a size chosen by hzz.chunking when None.
+    """
+    target_entries = step_size or entries_per_chunk(tree, PLAN.branches, val, costs)
+    return chunk_boundaries(tree, PLAN.branches, target_entries, int(tree.num_entries*fraction)) # process up to numevents*fraction
+
+
+def chunk_ranges(sample, step_size=None, data_path=DATA_PATH, fraction=1.0):
+    """
+    Split each ROOT file of `sample` into basket-aligned entry ranges without reading any event data.
+    Yields (val, idx, path, entry_start, entry_stop). A skim (see hzz.skim) is split into its part files.
+    """
+    if skim.is_skim(data_path):
+        yield from skim.chunk_ranges(sample, data_path)
+        return
+
+    costs = load_costs() if step_size is None else None
+
+    for val in samples[sample]['list']:
+        path = file_path(sample, val, data_path)
+        with uproot.open(path) as file:
+            boundaries = file_chunks(file["mini"], val, step_size, fraction, costs)
+
+        for idx, (entry_start, entry_stop) in enumerate(boundaries):
+            yield val, idx, path, entry_start, entry_stop
+
+
+def iterate_chunks(sample, step_size=None, data_path=DATA_PATH, fraction=1.0):
+    """
+    Open each ROOT file of `sample` and read it chunk by chunk along basket boundaries.
+    Yields (val, idx, path, entry_start, entry_stop, data).
+    """
+    if skim.is_skim(data_path):
+        for val, idx, path, entry_start, entry_stop in skim.chunk_ranges(sample, data_path):
+            yield val, idx, path, entry_start, entry_stop, skim.read(path)
+        return
+
+    costs = load_costs() if step_size is None else None
+
+    for val in samples[sample]['list']:
+        # Open file
+        path = file_path(sample, val, data_path)
+        with uproot.open(path) as file:
+            tree = file["mini"]
+            for idx, (entry_start, entry_stop) in enumerate(file_chunks(tree, val, step_size, fraction, costs)):
+                data = tree.arrays(PLAN.branches, library="ak",
+                                   entry_start=entry_start, entry_stop=entry_stop)
+                yield val, idx, path, entry_start, entry_stop, data
+
+
+def read_chunk(path, entry_start, entry_stop, branches=None):
+    """
+    Read the branches the analysis plan uses (or `branches`) for entries [entry_start, entry_stop) of one ROOT file,
+    or the whole of one skim part.
+    """
+    if path.endswith(".parquet"):
+        return skim.read(path, branches)
+    with uproot.open(path) as file:
+        return file["mini"].arrays(branches or PLAN.branches, library="ak",
+                                   entry_start=entry_start, entry_stop=entry_stop)
@@ -0,0 +1,182 @@
+"""
+Per-chunk stage timings written as JSON lines.
+
+Set HZZ_METRICS_DIR to a directory to enable. Each process appends one record
+per chunk to its own <service>-<host>-<pid>.jsonl file there, holding the
+seconds spent in each stage plus events and bytes in/out. When unset, every
+call returns a shared no-op object so the instrumented code pays almost nothing.
+
+Other sinks (e.g. the Prometheus exporter) can subscribe to finished chunks
+with add_observer(), which also enables recording without HZZ_METRICS_DIR.
+
+Summarise the records of a run (from any number of processes or pods) with
+
+    python -m hzz.metrics $HZZ_METRICS_DIR
+"""
+import argparse
+import glob
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+METRICS_DIR = os.getenv("HZZ_METRICS_DIR")
+
+COUNTERS = ['events_in', 'events_out', 'bytes_in', 'bytes_out']
+
+_NULL_STAGE = nullcontext()
+_recorders = {}
+_observers = []
+
+
+class ChunkMetrics:
+    """
+    Timings and counters for one chunk, written out by emit().
+    """
+
+    def __init__(self, service, recorder, **fields):
+        self.service = service
+        self.recorder = recorder
+        self.record = dict(fields, service=service, start=time.time(), stages={})
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stages = self.record['stages']
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, **counts):
+        self.record.update(counts)
+
+    def emit(self):
+        self.record['elapsed'] = time.time() - self.record['start']
+        if self.recorder:
+            self.recorder.write(self.record)
+        for observer in _observers:
+            observer(self.service, self.record)
+
+
+class NullChunkMetrics:
+    """
+    Stand-in used when metrics are disabled.
+    """
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def count(self, **counts):
+        pass
+
+    def emit(self):
+        pass
+
+
+NULL = NullChunkMetrics()
+
+
+class Recorder:
+    """
+    Appends chunk records from this process to a JSON lines file.
+    """
+
+    def __init__(self, directory, service):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{service}-{socket.gethostname()}-{os.getpid()}.jsonl")
+        self.file = open(self.path, "a", buffering=1)  # line buffered so records survive a killed pod
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+
+
+def add_observer(observer):
+    """
+    Call observer(service, record) for every chunk emitted in this process.
+    """
+    _observers.append(observer)
+
+
+def chunk(service, **fields):
+    """
+    Start recording a chunk for `service`. Returns a no-op object when metrics are disabled.
+    """
+    if not METRICS_DIR and not _observers:
+        return NULL
+
+    recorder = None
+    if METRICS_DIR:
+        # Keyed by pid as well so forked pool workers don't share the parent's file
+        key = (service, os.getpid())
+        if key not in _recorders:
+            _recorders[key] = Recorder(METRICS_DIR, service)
+        recorder = _recorders[key]
+    return ChunkMetrics(service, recorder, **fields)
+
+
+def load(directory):
+    """
+    Read every chunk record written into `directory`.
+    """
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        with open(path) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def summarize(records):
+    """
+    Percentiles of each stage's per-chunk time and totals of the counters.
+    """
+    stage_times = {}
+    for record in records:
+        for stage, seconds in record['stages'].items():
+            stage_times.setdefault(stage, []).append(seconds)
+    # Whole-chunk time goes last
+    if records:
+        stage_times['chunk'] = [record.get('elapsed', 0.0) for record in records]
+
+    summary = {'chunks': len(records), 'stages': {}, 'totals': {}}
+    for stage, times in stage_times.items():
+        times = np.asarray(times)
+        summary['stages'][stage] = {
+            'total': float(times.sum()),
+            'p50': float(np.percentile(times, 50)),
+            'p90': float(np.percentile(times, 90)),
+            'p99': float(np.percentile(times, 99)),
+            'max': float(times.max()),
+        }
+    for counter in COUNTERS:
+        summary['totals'][counter] = sum(record.get(counter, 0) for record in records)
+    return summary
+
+
+def print_summary(summary):
+    print(f"{summary['chunks']} chunks")
+    print(f"{'stage':<16}{'total s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, stats in summary['stages'].items():
+        print(f"{stage:<16}{stats['total']:>10.2f}{stats['p50'] * 1e3:>10.1f}{stats['p90'] * 1e3:>10.1f}"
+              f"{stats['p99'] * 1e3:>10.1f}{stats['max'] * 1e3:>10.1f}")
+    print("  ".join(f"{counter}={total}" for counter, total in summary['totals'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise per-chunk metrics written with HZZ_METRICS_DIR.")
+    parser.add_argument("directory", nargs="?", default=METRICS_DIR)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = summarize(load(args.directory))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
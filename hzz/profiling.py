@@ -0,0 +1,91 @@
+"""
+Opt-in cProfile of a running service, without rebuilding its image.
+
+Enable with HZZ_PROFILE=1 or --profile on the service command line. The
+profiler runs for the first HZZ_PROFILE_CHUNKS chunks (--profile-chunks) or
+HZZ_PROFILE_SECONDS seconds (--profile-seconds), whichever comes first, then
+dumps <service>-<host>-<pid>.prof plus a text summary into HZZ_PROFILE_DIR
+(--profile-dir). Inspect with `python -m pstats file.prof` or snakeviz.
+"""
+import argparse
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import socket
+import sys
+import time
+
+_active = None
+
+
+class Profiler:
+    """
+    cProfile that stops and dumps itself after a number of chunks or seconds.
+    """
+
+    def __init__(self, service, directory, max_chunks, max_seconds):
+        self.service = service
+        self.directory = directory
+        self.max_chunks = max_chunks
+        self.max_seconds = max_seconds
+        self.chunks = 0
+        self.start = time.time()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        print(f"Profiling {service} for {max_chunks} chunks or {max_seconds}s")
+
+    def tick(self):
+        """
+        Count one chunk, dumping the profile once the chunk or time budget is used up.
+        """
+        self.chunks += 1
+        if self.chunks >= self.max_chunks or time.time() - self.start >= self.max_seconds:
+            self.dump()
+
+    def dump(self):
+        global _active
+        if self.profile is None:
+            return
+        self.profile.disable()
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.service}-{socket.gethostname()}-{os.getpid()}.prof")
+        self.profile.dump_stats(path)
+
+        # Human-readable top functions next to the raw profile
+        summary = io.StringIO()
+        pstats.Stats(self.profile, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(path[:-len(".prof")] + ".txt", "w") as f:
+            f.write(summary.getvalue())
+
+        print(f"Profile of {self.chunks} chunks written to {path}")
+        self.profile = None
+        _active = None
+
+
+def start(service, argv=None):
+    """
+    Start profiling `service` if enabled by environment variable or command-line flag.
+    """
+    global _active
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", action="store_true", default=os.getenv("HZZ_PROFILE", "0") == "1")
+    parser.add_argument("--profile-chunks", type=int, default=int(os.getenv("HZZ_PROFILE_CHUNKS", "50")))
+    parser.add_argument("--profile-seconds", type=float, default=float(os.getenv("HZZ_PROFILE_SECONDS", "300")))
+    parser.add_argument("--profile-dir", default=os.getenv("HZZ_PROFILE_DIR", "profiles"))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+
+    if args.profile:
+        _active = Profiler(service, args.profile_dir, args.profile_chunks, args.profile_seconds)
+        # Still write the profile if the service finishes before the budget is used up
+        atexit.register(_active.dump)
+
+
+def tick():
+    """
+    Mark one chunk done. Does nothing unless profiling is active.
+    """
+    if _active is not None:
+        _active.tick()
@@ -0,0 +1,62 @@
+"""
+Prometheus /metrics endpoint for the worker and aggregator services.
+
+start() serves the metrics over HTTP and subscribes to the per-chunk records
+from hzz.metrics, so anything instrumented there is exported as well.
+prometheus_client is only imported when the endpoint is started.
+"""
+from contextlib import nullcontext
+
+from . import metrics
+
+# Per-chunk latency buckets in seconds, from a tiny signal chunk to a full 100k-event data chunk
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_exported = None
+
+
+def start(port):
+    """
+    Serve /metrics on `port` and begin exporting chunk records.
+    """
+    global _exported
+    import prometheus_client
+
+    _exported = {
+        'chunks': prometheus_client.Counter('hzz_chunks_processed_total', 'Chunks processed', ['service']),
+        'events_in': prometheus_client.Counter('hzz_events_in_total', 'Events received', ['service']),
+        'events_out': prometheus_client.Counter('hzz_events_out_total', 'Events passing the selection', ['service']),
+        'bytes_in': prometheus_client.Counter('hzz_bytes_decoded_total', 'Message bytes decoded', ['service']),
+        'bytes_out': prometheus_client.Counter('hzz_bytes_encoded_total', 'Message bytes encoded', ['service']),
+        'chunk_seconds': prometheus_client.Histogram('hzz_chunk_seconds', 'Time to handle one chunk',
+                                                     ['service'], buckets=LATENCY_BUCKETS),
+        'stage_seconds': prometheus_client.Histogram('hzz_stage_seconds', 'Time spent in each stage of a chunk',
+                                                     ['service', 'stage'], buckets=LATENCY_BUCKETS),
+        'in_flight': prometheus_client.Gauge('hzz_chunks_in_flight', 'Chunks currently being handled', ['service']),
+    }
+
+    prometheus_client.start_http_server(port)
+    metrics.add_observer(observe)
+    print(f"Serving Prometheus metrics on :{port}/metrics")
+
+
+def observe(service, record):
+    """
+    Export one finished chunk record.
+    """
+    _exported['chunks'].labels(service).inc()
+    for counter in metrics.COUNTERS:
+        if counter in record:
+            _exported[counter].labels(service).inc(record[counter])
+    _exported['chunk_seconds'].labels(service).observe(record['elapsed'])
+    for stage, seconds in record['stages'].items():
+        _exported['stage_seconds'].labels(service, stage).observe(seconds)
+
+
+def in_flight(service):
+    """
+    Context manager counting the chunk being handled in the in-flight gauge.
+    """
+    if _exported is None:
+        return nullcontext()
+    return _exported['in_flight'].labels(service).track_inprogress()
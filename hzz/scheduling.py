@@ -0,0 +1,67 @@
+"""
+Publish order and RabbitMQ priorities for chunks, longest estimated work first.
+
+A chunk's cost is its number of entries times the seconds per event measured
+for its file (hzz.chunking.load_costs). Files with no measurement use the
+median of the other files of their sample, then DEFAULT_SECONDS_PER_EVENT.
+Publishing the costliest chunks first (the longest-processing-time rule)
+starts the expensive Z/ttbar backgrounds early. Otherwise they are left as
+stragglers at the end of the run.
+"""
+import heapq
+import os
+
+import numpy as np
+
+from .constants import sample_of, samples
+
+# 'cost' publishes longest work first, 'fifo' keeps the samples dict order
+SCHEDULE = os.getenv("SCHEDULE", "cost")
+# x-max-priority of data_chunks. Chunks get 1..MAX_PRIORITY, so anything published with 0 (the 'done' signal) goes last
+MAX_PRIORITY = int(os.getenv("MAX_PRIORITY", "10"))
+DEFAULT_SECONDS_PER_EVENT = float(os.getenv("DEFAULT_SECONDS_PER_EVENT", "1e-5"))
+
+
+def seconds_per_event(val, costs):
+    """
+    Measured seconds per event of file `val`, else the median of its sample's measured files.
+    """
+    if val in costs:
+        return costs[val]
+    measured = [costs[other] for other in samples[sample_of(val)]['list'] if other in costs]
+    if measured:
+        return float(np.median(measured))
+    return DEFAULT_SECONDS_PER_EVENT
+
+
+def estimate(val, entry_start, entry_stop, costs):
+    """
+    Estimated worker seconds for entries [entry_start, entry_stop) of file `val`.
+    """
+    return (entry_stop - entry_start) * seconds_per_event(val, costs)
+
+
+def longest_first(chunks, costs):
+    """
+    Sort (sample, val, idx, path, entry_start, entry_stop) chunks by descending estimated cost.
+    Returns a list of (cost, chunk).
+    """
+    estimated = [(estimate(chunk[1], chunk[4], chunk[5], costs), chunk) for chunk in chunks]
+    return sorted(estimated, key=lambda item: item[0], reverse=True)
+
+
+def priority(rank, n, levels=MAX_PRIORITY):
+    """
+    Message priority of the chunk at `rank` (0 = costliest) of `n`: from `levels` down to 1, in equal-sized bands.
+    """
+    return levels - rank * levels // max(n, 1)
+
+
+def makespan(costs, workers):
+    """
+    Finish time of `costs` handed out in order to `workers` workers that each take the next chunk when idle.
+    """
+    free_at = [0.0] * workers
+    for cost in costs:
+        heapq.heappush(free_at, heapq.heappop(free_at) + cost)
+    return max(free_at)
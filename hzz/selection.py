@@ -0,0 +1,45 @@
+import awkward as ak
+
+from . import metrics
+from .analysis import PLAN
+
+
+def select_events(data, chunk_metrics=metrics.NULL):
+    """
+    Apply the cuts of the analysis plan (hzz/analysis.toml).
+    """
+    return PLAN.select(data, chunk_metrics)
+
+
+def derive(data, val, chunk_metrics=metrics.NULL):
+    """
+    Calculate the derived quantities of selected events and, for MC, the total event weight.
+    """
+    data = PLAN.derive(data, chunk_metrics)
+
+    # Store Monte Carlo weights in the data
+    if 'data' not in val:  # Only calculates weights if the data is MC
+        data = PLAN.weigh(data, val, chunk_metrics)
+    return data
+
+
+def process_chunk(data, val, chunk_metrics=metrics.NULL):
+    """
+    Process a single chunk of events from file `val`: apply the cuts,
+    calculate the derived quantities and, for MC, the total event weight.
+    Stage timings are recorded into `chunk_metrics`.
+    """
+    # Number of events in this batch
+    nIn = len(data)
+
+    data = derive(select_events(data, chunk_metrics), val, chunk_metrics)
+
+    if 'data' not in val:
+        nOut = ak.sum(data['totalWeight'])  # sum of weights passing cuts in this batch
+    else:
+        nOut = len(data)
+
+    print("\t\t nIn: "+str(nIn)+",\t nOut: \t"+str(nOut))  # events before and after
+    chunk_metrics.count(events_in=nIn, events_out=len(data))
+
+    return data
@@ -0,0 +1,74 @@
+import json
+import os
+
+import awkward as ak
+import numpy as np
+
+# Compression of message bodies, announced to the receiver through the AMQP content-encoding property.
+# 'identity' sends bodies as they are; 'zstd' needs the zstandard package and 'lz4' the lz4 package.
+CONTENT_ENCODING = os.getenv("CONTENT_ENCODING", "identity")
+# Codec level; unset uses the codec's default (zstd 3, lz4 0)
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL")) if os.getenv("COMPRESSION_LEVEL") else None
+
+ENCODINGS = ('identity', 'zstd', 'lz4')
+
+
+def dumps(message):
+    """
+    Serialize a chunk message to bytes. An awkward array under 'data' and the numpy arrays
+    of filled histograms under 'histograms' are converted to plain lists.
+    """
+    if isinstance(message.get('data'), ak.Array):
+        message = dict(message, data=ak.to_list(message['data']))
+    if 'histograms' in message:
+        message = dict(message, histograms={name: {key: np.asarray(value).tolist() for key, value in sums.items()}
+                                            for name, sums in message['histograms'].items()})
+    return json.dumps(message).encode()
+
+
+def loads(body):
+    """
+    Deserialize a chunk message, turning 'data' back into an awkward array and histograms into numpy arrays.
+    """
+    message = json.loads(body)
+    if 'data' in message:
+        message['data'] = ak.from_iter(message['data'])
+    if 'histograms' in message:
+        message['histograms'] = {name: {key: np.asarray(value) for key, value in sums.items()}
+                                 for name, sums in message['histograms'].items()}
+    return message
+
+
+def compress(body, encoding=CONTENT_ENCODING, level=COMPRESSION_LEVEL):
+    """
+    Compress a serialized body with `encoding`.
+    """
+    if encoding in (None, 'identity'):
+        return body
+    if encoding == 'zstd':
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(body)
+    if encoding == 'lz4':
+        import lz4.frame
+
+        return lz4.frame.compress(body, compression_level=level or 0)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def decompress(body, encoding):
+    """
+    Undo `compress` for a body received with content-encoding `encoding`.
+    """
+    if encoding in (None, 'identity'):
+        return body
+    if encoding == 'zstd':
+        import zstandard
+
+        # Bodies are compressed in one shot, so the frame header records the content size
+        return zstandard.ZstdDecompressor().decompress(body)
+    if encoding == 'lz4':
+        import lz4.frame
+
+        return lz4.frame.decompress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
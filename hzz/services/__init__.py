@@ -0,0 +1,4 @@
+"""
+Broker-based loader, worker and aggregator services shared by the
+RabbitIntegration and Kubernetes deployments.
+"""
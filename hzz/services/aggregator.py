@@ -0,0 +1,154 @@
+import json
+import os
+import time
+from functools import partial
+
+from .. import blobstore, metrics, profiling, prometheus, serialization, speculation, tracing
+from ..backends.rabbitmq import (QUEUE_NAME, RESULTS_QUEUE, body_encoding, claim_check, connect, delete_blobs,
+                                 input_claim_check, publish_message, receive_body)
+from ..analysis import PLAN, merge
+from ..constants import samples
+from ..histogram import plot_all
+from ..scheduling import MAX_PRIORITY
+
+
+def callback(grouped_data, tracker, output_path, ch, method, properties, body):
+    """
+    Callback for consuming messages from RabbitMQ.
+    """
+    with prometheus.in_flight('aggregator'):
+        aggregate_message(grouped_data, tracker, output_path, ch, method, properties, body)
+    profiling.tick()
+
+
+def finish(grouped_data, tracker, output_path, ch):
+    ch.stop_consuming()
+    plot_all(grouped_data, output_path)  # Generate the plots once all chunks are processed
+    # The manifest was kept until now in case the run had to be picked up again
+    delete_blobs(tracker.manifest_blob)
+
+    if tracker.chunks:
+        report = tracker.report()
+        report_path = os.path.splitext(output_path)[0] + "_report.json"
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Run {report['run']}: {report['aggregated']}/{report['chunks']} chunks aggregated, "
+              f"{len(report['quarantined'])} quarantined. Report saved to {report_path}")
+        for chunk in report['quarantined']:
+            print(f"  quarantined {chunk['val']}-{chunk['idx']}: {chunk['error']}")
+
+
+def aggregate_message(grouped_data, tracker, output_path, ch, method, properties, body):
+    """
+    Add the histograms of one processed chunk to `grouped_data`, and plot them all once the loader's
+    manifest is complete (or on the 'done' signal when there is no manifest).
+    """
+    received_at = time.time()
+    trace_id, parent_id, published_at = tracing.extract(properties)
+    chunk_metrics = metrics.chunk('aggregator')
+
+    span = tracing.Span('aggregator', 'aggregate', trace_id, parent_id)
+    try:
+        body = receive_body(properties, body)
+    except blobstore.BlobMissing:
+        print(f"Blob {claim_check(properties)} already collected, dropping redelivered result")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        return
+    bytes_in = len(body)
+    with chunk_metrics.stage('decompress'):
+        body = serialization.decompress(body, body_encoding(properties))
+    with chunk_metrics.stage('decode'):
+        message = serialization.loads(body)
+
+    if 'manifest' in message:
+        tracker.expect(message['run'], message['manifest'], claim_check(properties))
+        print(f"Expecting {len(message['manifest'])} chunks for run {message['run']}")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        return
+
+    if 'done' in message:
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        if tracker.chunks:
+            # A worker stopped; completion is judged against the manifest
+            print(f"Worker finished, {len(tracker.outstanding())} chunks outstanding")
+            return
+        print("Received 'done' signal. All chunks processed.")
+        finish(grouped_data, tracker, output_path, ch)
+        return
+
+    if 'quarantined' in message:
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        if tracker.quarantine(message['quarantined'], message['error']):
+            chunk = message['quarantined']
+            print(f"Chunk {chunk['val']}-{chunk['idx']} quarantined after {message['attempts']} attempts")
+            if tracker.finished():
+                finish(grouped_data, tracker, output_path, ch)
+        return
+
+    # Keep the first copy of each chunk; later (speculative or redelivered) copies and results of older runs are dropped
+    if not tracker.complete(message, message.get('seconds')):
+        print(f"Dropping duplicate or stale result {message['val']}-{message['idx']}")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        delete_blobs(claim_check(properties), input_claim_check(properties))
+        return
+
+    # Add chunk data to the corresponding category
+    sample_key = message['sample']
+
+    if sample_key in grouped_data:
+        with chunk_metrics.stage('aggregate'):
+            # Results from workers that predate histogram filling carry only the events
+            filled = message.get('histograms') or PLAN.fill(message['data'])
+            merge(grouped_data[sample_key], filled)
+        print(f"Aggregated chunk {message['val']}-{message['idx']} for {sample_key}")
+
+    events = message['events'] if 'events' in message else len(message['data'])
+    chunk_metrics.count(val=message['val'], idx=message['idx'], bytes_in=bytes_in, events_in=events)
+    chunk_metrics.emit()
+
+    if trace_id:
+        if published_at:
+            tracing.record('aggregator', 'queue_wait', trace_id, parent_id, published_at, received_at)
+        span.record.update(val=message['val'], idx=message['idx'])
+        span.finish()
+
+    ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    # The chunk is safely aggregated: its offloaded input and result bodies are no longer needed
+    delete_blobs(claim_check(properties), input_claim_check(properties))
+
+    if tracker.finished():
+        print(f"All {len(tracker.chunks)} chunks of run {tracker.run} accounted for.")
+        finish(grouped_data, tracker, output_path, ch)
+
+
+def speculate(connection, channel, tracker):
+    """
+    Publish straggler chunks again as range-only tasks, then check again in SPECULATE_INTERVAL seconds.
+    """
+    if tracker.chunks and not tracker.finished():
+        depth = channel.queue_declare(QUEUE_NAME, passive=True).method.message_count
+        for chunk in tracker.stragglers(depth):
+            print(f"Chunk {chunk['val']}-{chunk['idx']} outstanding for over {tracker.threshold():.0f}s, "
+                  f"publishing a speculative copy")
+            # Highest priority so the copy starts as soon as any worker is free
+            publish_message(channel, QUEUE_NAME, chunk, headers={'run': chunk['run'], 'val': chunk['val'], 'idx': chunk['idx']},
+                            priority=MAX_PRIORITY)
+    connection.call_later(speculation.SPECULATE_INTERVAL, partial(speculate, connection, channel, tracker))
+
+
+def main(output_path):
+    profiling.start('aggregator')
+    connection, channel = connect([RESULTS_QUEUE, QUEUE_NAME])
+
+    # Aggregated histograms of each sample
+    grouped_data = {key: {} for key in samples.keys()}
+    tracker = speculation.Tracker()
+
+    if speculation.SPECULATE:
+        connection.call_later(speculation.SPECULATE_INTERVAL, partial(speculate, connection, channel, tracker))
+
+    # Start consuming messages from the processed_chunks queue
+    print("Aggregator waiting for processed chunks...")
+    channel.basic_consume(queue=RESULTS_QUEUE, on_message_callback=partial(callback, grouped_data, tracker, output_path))
+    channel.start_consuming()
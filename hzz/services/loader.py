@@ -0,0 +1,146 @@
+import os
+import time
+import uuid
+
+from .. import profiling, tracing
+from ..backends.rabbitmq import QUEUE_NAME, RESULTS_QUEUE, connect_publisher, publish_message
+from ..chunking import load_costs
+from ..constants import samples
+from ..loader import chunk_ranges, read_chunk
+from ..scheduling import SCHEDULE, estimate, longest_first, priority
+
+# 'data' ships the events inside each message. 'ranges' ships only the file and
+# basket-aligned entry range, and each worker reads (and decompresses) its own range.
+CHUNK_PAYLOAD = os.getenv("CHUNK_PAYLOAD", "data")
+
+# Backpressure: stop reading once data_chunks holds BACKLOG_HIGH chunks and resume when it
+# has drained to BACKLOG_LOW, checking every BACKLOG_POLL seconds. BACKLOG_HIGH=0 disables it.
+BACKLOG_HIGH = int(os.getenv("BACKLOG_HIGH", "100"))
+BACKLOG_LOW = int(os.getenv("BACKLOG_LOW", str(BACKLOG_HIGH // 2)))
+BACKLOG_POLL = float(os.getenv("BACKLOG_POLL", "1"))
+
+
+def wait_for_backlog(channel):
+    """
+    Block while the chunk backlog is above the configured window.
+    """
+    if not BACKLOG_HIGH:
+        return
+    depth = channel.queue_depth(QUEUE_NAME)
+    if depth < BACKLOG_HIGH:
+        return
+
+    print(f"Backlog at {depth} chunks, pausing reads until it drops to {BACKLOG_LOW}")
+    paused = time.time()
+    while depth > BACKLOG_LOW:
+        time.sleep(BACKLOG_POLL)
+        depth = channel.queue_depth(QUEUE_NAME)
+    print(f"Backlog at {depth} chunks, resuming after {time.time() - paused:.1f}s")
+
+
+def chunk_message(chunk, run, cost=None):
+    """
+    Message describing a (sample, val, idx, path, entry_start, entry_stop) chunk of `run`.
+    """
+    sample, val, idx, path, entry_start, entry_stop = chunk
+    message = {
+        'run': run,
+        'sample': sample,
+        'val': val,
+        'idx': idx,
+        'path': path,
+        'entry_start': entry_start,
+        'entry_stop': entry_stop,
+    }
+    if cost is not None:
+        message['cost'] = cost
+    return message
+
+
+def publish_chunk(channel, read, chunk_data, priority=None):
+    """
+    Publish one chunk message. `read` is the tracing span of its read.
+    """
+    print(f"Publishing chunk: {chunk_data['val']}-{chunk_data['idx']}")
+    with tracing.span('loader', 'publish', read.trace_id, read.record['span_id']) as span:
+        # The chunk's identity also goes in the headers, so a worker can report it even if the body is unreadable
+        headers = dict(span.headers(), run=chunk_data['run'], val=chunk_data['val'], idx=chunk_data['idx'])
+        publish_message(channel, QUEUE_NAME, chunk_data, headers=headers, priority=priority)
+    profiling.tick()
+
+    # The next chunk is only read once the broker has room for it
+    wait_for_backlog(channel)
+
+
+def publish_manifest(channel, run, chunks, costs):
+    """
+    Announce every chunk of `run` to the aggregator, which uses it to know when the run is
+    complete and which chunks to re-execute speculatively (hzz.speculation).
+    """
+    manifest = [chunk_message(chunk, run, estimate(chunk[1], chunk[4], chunk[5], costs)) for chunk in chunks]
+    publish_message(channel, RESULTS_QUEUE, {'manifest': manifest, 'run': run})
+    print(f"Published manifest of {len(manifest)} chunks for run {run}")
+
+
+def load_in_order(channel, chunks, run=None):
+    """
+    Publish `chunks` in the order given (samples order for the manifest's list), reading each one's events
+    unless only ranges are sent. These are the manifest's own chunks, so the boundaries cannot change
+    between announcing and publishing them.
+    """
+    sample = None
+    for chunk in chunks:
+        if chunk[0] != sample:
+            sample = chunk[0]
+            print(f'Processing {sample} samples')
+        _, val, idx, path, entry_start, entry_stop = chunk
+        read_start = time.time()
+        chunk_data = chunk_message(chunk, run)
+        if CHUNK_PAYLOAD != 'ranges':
+            chunk_data['data'] = read_chunk(path, entry_start, entry_stop)
+        read = tracing.record('loader', 'read', None, None, read_start, time.time(), val=val, idx=idx)
+        publish_chunk(channel, read, chunk_data)
+
+
+def load_longest_first(channel, chunks, costs, run=None):
+    """
+    Publish `chunks` of every sample in order of descending estimated cost, with matching
+    message priorities, so the longest work is picked up first.
+    """
+    scheduled = longest_first(chunks, costs)
+    print(f"Scheduling {len(scheduled)} chunks, {sum(cost for cost, _ in scheduled):.0f}s of estimated work")
+
+    for rank, (cost, chunk) in enumerate(scheduled):
+        sample, val, idx, path, entry_start, entry_stop = chunk
+        read_start = time.time()
+        chunk_data = chunk_message(chunk, run, cost)
+        if CHUNK_PAYLOAD != 'ranges':
+            chunk_data['data'] = read_chunk(path, entry_start, entry_stop)
+        read = tracing.record('loader', 'read', None, None, read_start, time.time(), val=val, idx=idx)
+        publish_chunk(channel, read, chunk_data, priority(rank, len(scheduled)))
+
+
+def main():
+    profiling.start('loader')
+    # Confirmed publishing: a chunk only counts as sent once the broker has it
+    channel = connect_publisher([QUEUE_NAME, RESULTS_QUEUE])
+
+    # List every chunk up front (file metadata only) and tell the aggregator what to expect
+    run = uuid.uuid4().hex
+    costs = load_costs()
+    chunks = [(sample, *chunk) for sample in samples for chunk in chunk_ranges(sample)]
+    publish_manifest(channel, run, chunks, costs)
+
+    # Process each sample and publish chunks to RabbitMQ
+    if SCHEDULE == 'cost':
+        load_longest_first(channel, chunks, costs, run)
+    else:
+        load_in_order(channel, chunks, run)
+
+    # Signal completion
+    publish_message(channel, QUEUE_NAME, {'done': True})
+
+    print("Data loading and chunking complete.")
+
+    # Wait for the outstanding confirms, then close the connection
+    channel.close()
@@ -0,0 +1,166 @@
+import os
+import time
+
+from .. import blobstore, metrics, profiling, prometheus, serialization, skim, tracing
+from ..backends.rabbitmq import (CHUNK_MAX_ATTEMPTS, DEAD_LETTER_QUEUE, QUEUE_NAME, RESULTS_QUEUE, body_encoding,
+                                 chunk_identity, claim_check, connect, pending_retries, publish_body, publish_message,
+                                 receive_body, retry_or_dead_letter)
+from ..analysis import PLAN
+from ..loader import read_chunk
+from ..cache import process_cached
+
+WORKER_PREFETCH = int(os.getenv("WORKER_PREFETCH", "1"))
+# How long to wait before passing the 'done' signal on while failed chunks are still waiting to be retried
+DONE_RECHECK_SECONDS = float(os.getenv("DONE_RECHECK_SECONDS", "1"))
+
+
+def handle_chunk(chunk_data, chunk_metrics=metrics.NULL):
+    """
+    Process one chunk message and build the result message: the plan's histograms filled from this chunk
+    and the number of selected events, not the events themselves.
+    """
+    print(f"Processing {chunk_data['val']} {chunk_data['idx']}...")
+
+    def read():
+        # Range-only messages: read this chunk's baskets straight from the file
+        if 'data' not in chunk_data:
+            with chunk_metrics.stage('read'):
+                chunk_data['data'] = read_chunk(chunk_data['path'], chunk_data['entry_start'], chunk_data['entry_stop'])
+        return chunk_data['data']
+
+    # Served from the result cache, when enabled, if this chunk was processed before with the same code
+    data = process_cached(chunk_data['val'], chunk_data['path'], chunk_data['entry_start'], chunk_data['entry_stop'],
+                          read, chunk_metrics)
+
+    # Skim mode: keep the selected events for later runs (see hzz.skim)
+    if skim.SKIM_OUTPUT:
+        with chunk_metrics.stage('skim'):
+            skim.write(chunk_data['val'], chunk_data['entry_start'], chunk_data['entry_stop'], data)
+
+    # Every histogram is filled here, in the same pass, so the aggregator only has to add them up
+    histograms = PLAN.fill(data, chunk_metrics=chunk_metrics)
+
+    print(f"Chunk {chunk_data['val']}-{chunk_data['idx']} processed.")
+
+    return {
+        'run': chunk_data.get('run'),
+        'sample': chunk_data['sample'],
+        'val': chunk_data['val'],
+        'idx': chunk_data['idx'],
+        'events': len(data),
+        'histograms': histograms,
+    }
+
+
+def callback(ch, method, properties, body):
+    """
+    Callback for consuming messages from RabbitMQ.
+    """
+    with prometheus.in_flight('worker'):
+        handle_message(ch, method, properties, body)
+    profiling.tick()
+
+
+def handle_message(ch, method, properties, body):
+    """
+    Decode, process and publish one message, acking it once the result is published.
+    """
+    received = body
+    try:
+        received_at = time.time()
+        trace_id, parent_id, published_at = tracing.extract(properties)
+        chunk_metrics = metrics.chunk('worker')
+
+        span = tracing.Span('worker', 'process', trace_id, parent_id)
+
+        # Deserialize the message, fetching the body first if it was offloaded to the blob store
+        try:
+            body = receive_body(properties, body)
+        except blobstore.BlobMissing:
+            # The aggregator already collected this chunk and deleted its blob: a redelivered duplicate
+            print(f"Blob {claim_check(properties)} already collected, dropping redelivered chunk")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        bytes_in = len(body)
+        with chunk_metrics.stage('decompress'):
+            body = serialization.decompress(body, body_encoding(properties))
+        with chunk_metrics.stage('decode'):
+            message = serialization.loads(body)
+
+        if 'done' in message:
+            # Chunks in the retry delay queues come back to data_chunks later, so keep consuming
+            # and put the signal back behind them
+            retrying = pending_retries(ch)
+            if retrying:
+                print(f"{retrying} chunks waiting to be retried, requeueing the 'done' signal")
+                time.sleep(DONE_RECHECK_SECONDS)
+                publish_message(ch, QUEUE_NAME, {'done': True})
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                return
+            print("All chunks processed. Exiting worker.")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            ch.stop_consuming()
+            return
+
+        chunk_metrics.count(val=message['val'], idx=message['idx'], bytes_in=bytes_in)
+
+        # Process the chunk
+        result = handle_chunk(message, chunk_metrics)
+        # Lets the aggregator spot stragglers against the typical chunk time
+        result['seconds'] = time.time() - received_at
+
+        # Publish the processed data to the results queue, continuing the loader's trace
+        with chunk_metrics.stage('encode'):
+            result_body = serialization.dumps(result)
+        with chunk_metrics.stage('compress'):
+            result_body = serialization.compress(result_body)
+        # Pass the input's blob key along so the aggregator can delete it with the result
+        headers = span.headers()
+        if claim_check(properties):
+            headers['input_claim_check'] = claim_check(properties)
+        publish_body(ch, RESULTS_QUEUE, result_body, headers=headers, content_encoding=serialization.CONTENT_ENCODING)
+        print(f"Published processed chunk: {result['val']}-{result['idx']}")
+        chunk_metrics.count(bytes_out=len(result_body))
+        chunk_metrics.emit()
+
+        if trace_id:
+            if published_at:
+                tracing.record('worker', 'queue_wait', trace_id, parent_id, published_at, received_at)
+            span.record.update(val=message['val'], idx=message['idx'])
+            span.finish()
+
+        # Acknowledge the task
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    except Exception as e:
+        print(f"Error processing message: {e}")
+        try:
+            failures = retry_or_dead_letter(ch, properties, received, e)
+        except Exception as retry_error:
+            # Could not reroute it, so leave it to the broker to deliver again
+            print(f"Could not publish for retry: {retry_error}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            return
+
+        if failures >= CHUNK_MAX_ATTEMPTS:
+            # Tell the aggregator, so the run can complete without this chunk
+            print(f"Chunk failed {failures} times, quarantined in {DEAD_LETTER_QUEUE}")
+            publish_message(ch, RESULTS_QUEUE, {'quarantined': chunk_identity(properties), 'error': str(e),
+                                                'attempts': failures})
+        else:
+            print(f"Chunk failed {failures} time(s), retrying after a delay")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+
+def main():
+    profiling.start('worker')
+    connection, channel = connect([QUEUE_NAME, RESULTS_QUEUE])
+
+    # One unacked chunk per worker: the broker hands out chunks as workers free up, in priority order
+    channel.basic_qos(prefetch_count=WORKER_PREFETCH)
+    channel.basic_consume(queue=QUEUE_NAME, on_message_callback=callback)
+
+    print('Waiting for messages')
+    channel.start_consuming()
+
+    publish_message(channel, RESULTS_QUEUE, {'done': True})
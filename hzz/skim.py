@@ -0,0 +1,134 @@
+"""
+Skims: the selected events of a run, written once as partitioned parquet and
+read back as the input of later runs.
+
+Set SKIM_OUTPUT to a directory and the workers (RabbitMQ and local) write the
+processed events of every chunk to
+
+    <SKIM_OUTPUT>/val=<val>/<entry_start>-<entry_stop>.parquet
+
+named by the entry range of the source file they came from. The events keep
+their branches and the derived quantities and weights computed for them, such
+as mass, channel and totalWeight. A _skim.json file records the plan that wrote
+them. Point DATA_PATH (or --data-path) at the skim directory to re-analyse
+from it. The loaders then publish one chunk per part file, and only the stored
+columns whose definition still matches the current plan are reused; the rest
+are computed again. Cuts are applied again as well, so a skim can be tightened
+but never loosened.
+
+Write each skim into a new directory: parts from runs with different chunk
+sizes overlap, and reading such a skim fails.
+"""
+import glob
+import json
+import os
+import uuid
+
+import awkward as ak
+import pyarrow.parquet as pq
+
+from .analysis import PLAN
+from .constants import samples
+
+SKIM_OUTPUT = os.getenv("SKIM_OUTPUT")
+SKIM_METADATA = "_skim.json"
+
+WEIGHT_COLUMNS = ['totalWeight', 'weightVariations']
+
+
+def plan_metadata(plan=PLAN):
+    """
+    What the stored columns depend on: the derived quantities (fused, so nested changes show) and the weights.
+    """
+    return {
+        'derived': plan.derived_exprs,
+        'weight': {'factors': plan.weight_factors, 'lumi': plan.lumi,
+                   'variations': plan.config.get('variations', {})},
+    }
+
+
+def is_skim(data_path):
+    return os.path.exists(os.path.join(data_path, SKIM_METADATA))
+
+
+def write_metadata(directory):
+    """
+    Record the plan in `directory`, refusing to mix parts written under different plans.
+    """
+    path = os.path.join(directory, SKIM_METADATA)
+    metadata = plan_metadata()
+    if os.path.exists(path):
+        with open(path) as f:
+            if json.load(f) != metadata:
+                raise ValueError(f"{directory} holds a skim written with another analysis plan")
+        return
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def part_path(directory, val, entry_start, entry_stop):
+    return os.path.join(directory, f"val={val}", f"{entry_start:012d}-{entry_stop:012d}.parquet")
+
+
+def write(val, entry_start, entry_stop, data, directory=SKIM_OUTPUT):
+    """
+    Write the processed events of one chunk to the skim in `directory`. Copies of the same chunk
+    (retries, speculative copies) write the same part, so it is never duplicated.
+    """
+    write_metadata(directory)
+    path = part_path(directory, val, entry_start, entry_stop)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write under a unique name and rename, so readers never see half a file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    ak.to_parquet(data, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def chunk_ranges(sample, data_path):
+    """
+    One chunk per part file of each file of `sample` in the skim at `data_path`, without reading any events.
+    Yields (val, idx, path, entry_start, entry_stop), the entry range being that of the source file.
+    """
+    for val in samples[sample]['list']:
+        parts = []
+        for path in glob.glob(os.path.join(data_path, f"val={val}", "*.parquet")):
+            entry_start, entry_stop = map(int, os.path.basename(path)[:-len(".parquet")].split("-"))
+            parts.append((entry_start, entry_stop, path))
+        parts.sort()
+        for (_, previous_stop, _), (entry_start, _, path) in zip(parts, parts[1:]):
+            if entry_start < previous_stop:
+                raise ValueError(f"Overlapping skim parts in {os.path.dirname(path)}: written by several runs?")
+        for idx, (entry_start, entry_stop, path) in enumerate(parts):
+            yield val, idx, path, entry_start, entry_stop
+
+
+def stale_columns(data_path):
+    """
+    Stored columns of the skim at `data_path` whose definition differs from the current plan's.
+    """
+    with open(os.path.join(data_path, SKIM_METADATA)) as f:
+        metadata = json.load(f)
+    current = plan_metadata()
+    stale = {name for name, expr in metadata['derived'].items() if current['derived'].get(name) != expr}
+    if metadata['weight'] != current['weight']:
+        stale.update(WEIGHT_COLUMNS)
+    return stale
+
+
+def read(path, branches=None):
+    """
+    Events of one skim part: `branches` (default: all the plan reads) and the derived quantities and
+    weights stored with them that are still valid.
+    """
+    skim_path = os.path.dirname(os.path.dirname(path))
+    stored = set(pq.read_schema(path).names)
+    reusable = (set(PLAN.derived) | set(WEIGHT_COLUMNS)) - stale_columns(skim_path)
+    columns = [column for column in (branches or PLAN.branches) if column in stored]
+    # Only reuse what this read needs: everything when reading for the full analysis
+    if branches is None:
+        columns += sorted(stored & reusable)
+    return ak.from_parquet(path, columns=columns)
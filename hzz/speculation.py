@@ -0,0 +1,137 @@
+"""
+Completion tracking and speculative re-execution of straggler chunks.
+
+The loader announces every chunk of a run in a manifest before publishing
+any of them. The aggregator feeds the results it receives into a Tracker.
+The Tracker knows when the run is complete and which results are duplicates.
+Once data_chunks has drained, every outstanding chunk is being worked on.
+Any chunk outstanding for much longer than the median chunk is then handed
+out again, and whichever copy finishes first is kept. Chunks that workers
+quarantined after failing repeatedly also count toward completion and are
+listed in the run report.
+"""
+import os
+import time
+
+import numpy as np
+
+SPECULATE = os.getenv("SPECULATE", "1") == "1"
+# A chunk is a straggler after SPECULATE_FACTOR x the median chunk time (and at least SPECULATE_MIN_SECONDS)
+SPECULATE_FACTOR = float(os.getenv("SPECULATE_FACTOR", "3"))
+SPECULATE_MIN_SECONDS = float(os.getenv("SPECULATE_MIN_SECONDS", "10"))
+SPECULATE_MAX_COPIES = int(os.getenv("SPECULATE_MAX_COPIES", "2"))
+SPECULATE_INTERVAL = float(os.getenv("SPECULATE_INTERVAL", "5"))
+
+
+def key(chunk):
+    """
+    Identity of a chunk or result message, shared by all copies of it.
+    """
+    return chunk['val'], chunk['idx']
+
+
+class Tracker:
+    """
+    Outstanding chunks of one run, from the loader's manifest and the results seen so far.
+    """
+
+    def __init__(self, factor=SPECULATE_FACTOR, min_seconds=SPECULATE_MIN_SECONDS, max_copies=SPECULATE_MAX_COPIES):
+        self.factor = factor
+        self.min_seconds = min_seconds
+        self.max_copies = max_copies
+        self.run = None
+        self.chunks = {}  # key -> manifest entry
+        self.done = set()
+        self.quarantined = {}  # key -> error of chunks the workers gave up on
+        self.duplicates = 0
+        self.durations = []  # worker seconds of completed chunks
+        self.copies = {}  # key -> speculative copies published
+        self.since = {}  # key -> time its latest copy became eligible to start
+        self.drained_at = None
+        self.manifest_blob = None  # claim check of the offloaded manifest, collected when the run finishes
+
+    def expect(self, run, chunks, manifest_blob=None):
+        """
+        Start tracking the manifest of `run`.
+        """
+        self.run = run
+        self.chunks = {key(chunk): chunk for chunk in chunks}
+        self.manifest_blob = manifest_blob
+
+    def complete(self, result, seconds=None):
+        """
+        Record a result. Returns False if it belongs to another run or the chunk already completed.
+        """
+        if self.run is not None and result.get('run') != self.run:
+            return False
+        if key(result) in self.done:
+            self.duplicates += 1
+            return False
+        self.done.add(key(result))
+        # Another copy may have been quarantined before this one succeeded
+        self.quarantined.pop(key(result), None)
+        if seconds is not None:
+            self.durations.append(seconds)
+        return True
+
+    def quarantine(self, chunk, error):
+        """
+        Record a chunk that failed too often to retry. Returns False if it is not outstanding in this run.
+        """
+        if chunk.get('run') != self.run or key(chunk) not in self.chunks or key(chunk) in self.done:
+            return False
+        self.quarantined[key(chunk)] = error
+        return True
+
+    def finished(self):
+        """
+        Every chunk of the manifest has either been aggregated or quarantined.
+        """
+        return bool(self.chunks) and self.done.union(self.quarantined).issuperset(self.chunks)
+
+    def outstanding(self):
+        return [chunk for k, chunk in self.chunks.items() if k not in self.done and k not in self.quarantined]
+
+    def report(self):
+        """
+        Summary of the run: chunks expected, aggregated, quarantined (with their errors) and copies.
+        """
+        return {
+            'run': self.run,
+            'chunks': len(self.chunks),
+            'aggregated': len(self.done & set(self.chunks)),
+            'quarantined': [dict(val=val, idx=idx, error=error) for (val, idx), error in self.quarantined.items()],
+            'outstanding': [dict(val=chunk['val'], idx=chunk['idx']) for chunk in self.outstanding()],
+            'speculative_copies': sum(self.copies.values()),
+            'duplicates_dropped': self.duplicates,
+        }
+
+    def threshold(self):
+        """
+        Seconds after which an outstanding chunk counts as a straggler.
+        """
+        median = float(np.median(self.durations)) if self.durations else 0.0
+        return max(self.min_seconds, self.factor * median)
+
+    def stragglers(self, queue_depth, now=None):
+        """
+        Chunks to publish again given the number of chunks still waiting in data_chunks.
+        """
+        now = time.time() if now is None else now
+        if queue_depth > 0:
+            # Chunks are still waiting for a free worker, so nothing outstanding is necessarily slow
+            self.drained_at = None
+            return []
+        if self.drained_at is None:
+            self.drained_at = now
+
+        stragglers = []
+        for chunk in self.outstanding():
+            k = key(chunk)
+            # Timed from when the queue drained, or from the latest copy, whichever is later
+            since = max(self.drained_at, self.since.get(k, self.drained_at))
+            if now - since > self.threshold() and self.copies.get(k, 0) < self.max_copies:
+                self.copies[k] = self.copies.get(k, 0) + 1
+                self.since[k] = now
+                stragglers.append(chunk)
+        return stragglers
@@ -0,0 +1,144 @@
+"""
+Trace a chunk from the loader through the worker to the aggregator.
+
+Each message carries trace_id, span_id and published_at in its AMQP headers.
+The receiving service records its own spans under the same trace_id, so the
+time a chunk spent being read, waiting in each queue, being processed and being
+aggregated can be reconstructed afterwards. Span records are written as JSON
+lines when HZZ_TRACE_DIR is set; headers are always stamped.
+
+    python -m hzz.tracing $HZZ_TRACE_DIR
+"""
+import argparse
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from .metrics import Recorder, load
+
+TRACE_DIR = os.getenv("HZZ_TRACE_DIR")
+
+_recorders = {}
+
+
+def new_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    """
+    One timed operation of a service on a chunk.
+    """
+
+    def __init__(self, service, name, trace_id=None, parent_id=None, **attrs):
+        self.record = {
+            'trace_id': trace_id or uuid.uuid4().hex,
+            'span_id': new_id(),
+            'parent_id': parent_id,
+            'service': service,
+            'name': name,
+            'start': time.time(),
+            **attrs,
+        }
+
+    @property
+    def trace_id(self):
+        return self.record['trace_id']
+
+    def headers(self):
+        """
+        AMQP headers for a message published from within this span.
+        """
+        return {'trace_id': self.trace_id, 'span_id': self.record['span_id'], 'published_at': time.time()}
+
+    def finish(self, end=None):
+        self.record['end'] = end or time.time()
+        write(self.record)
+
+
+@contextmanager
+def span(service, name, trace_id=None, parent_id=None, **attrs):
+    """
+    Time the with-block as a span. A new trace is started when trace_id is None.
+    """
+    current = Span(service, name, trace_id, parent_id, **attrs)
+    try:
+        yield current
+    finally:
+        current.finish()
+
+
+def record(service, name, trace_id, parent_id, start, end, **attrs):
+    """
+    Write a span whose start and end were measured elsewhere (e.g. time waiting in a queue).
+    A new trace is started when trace_id is None. Returns the span.
+    """
+    past = Span(service, name, trace_id, parent_id, **attrs)
+    past.record['start'] = start
+    past.finish(end)
+    return past
+
+
+def extract(properties):
+    """
+    (trace_id, parent span_id, published_at) from a received message's headers.
+    """
+    headers = (properties.headers if properties is not None else None) or {}
+    return headers.get('trace_id'), headers.get('span_id'), headers.get('published_at')
+
+
+def write(span_record):
+    if not TRACE_DIR:
+        return
+    key = (span_record['service'], os.getpid())
+    if key not in _recorders:
+        _recorders[key] = Recorder(TRACE_DIR, f"spans-{span_record['service']}")
+    _recorders[key].write(span_record)
+
+
+def chunk_timelines(spans):
+    """
+    Per-trace durations of each span name plus end-to-end latency, keyed by trace_id.
+    """
+    traces = {}
+    for span_record in spans:
+        traces.setdefault(span_record['trace_id'], []).append(span_record)
+
+    timelines = {}
+    for trace_id, trace_spans in traces.items():
+        timeline = {'chunk': next((f"{s['val']}-{s['idx']}" for s in trace_spans if 'val' in s), trace_id)}
+        for span_record in trace_spans:
+            name = f"{span_record['service']}.{span_record['name']}"
+            timeline[name] = timeline.get(name, 0.0) + span_record['end'] - span_record['start']
+        timeline['end_to_end'] = max(s['end'] for s in trace_spans) - min(s['start'] for s in trace_spans)
+        timelines[trace_id] = timeline
+    return timelines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruct chunk latencies from span records.")
+    parser.add_argument("directory", nargs="?", default=TRACE_DIR)
+    parser.add_argument("--slowest", type=int, default=10, help="number of slowest chunks to break down")
+    args = parser.parse_args()
+
+    timelines = list(chunk_timelines(load(args.directory)).values())
+    names = sorted({name for timeline in timelines for name in timeline if name not in ('chunk', 'end_to_end')})
+    names.append('end_to_end')
+
+    print(f"{len(timelines)} chunks")
+    print(f"{'span':<28}{'p50 s':>10}{'p90 s':>10}{'max s':>10}")
+    for name in names:
+        values = np.asarray([timeline[name] for timeline in timelines if name in timeline])
+        print(f"{name:<28}{np.percentile(values, 50):>10.3f}{np.percentile(values, 90):>10.3f}{values.max():>10.3f}")
+
+    print(f"\nSlowest {args.slowest} chunks")
+    for timeline in sorted(timelines, key=lambda t: t['end_to_end'], reverse=True)[:args.slowest]:
+        breakdown = "  ".join(f"{name}={timeline[name]:.3f}" for name in names[:-1] if name in timeline)
+        print(f"{timeline['chunk']:<24}{timeline['end_to_end']:>8.3f}s  {breakdown}")
+
+
+if __name__ == "__main__":
+    main()
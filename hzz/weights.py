@@ -0,0 +1,31 @@
+import numpy as np
+
+from . import infofile
+
+
+def calc_weight(weight_variables, sample, events, lumi):
+    """
+    Monte Carlo event weight for `lumi` fb^-1: cross-section normalisation times the per-event scale factors.
+    """
+    info = infofile.infos[sample]
+    xsec_weight = (lumi*1000*info["xsec"])/(info["sumw"]*info["red_eff"]) #*1000 to go from fb-1 to pb-1
+    total_weight = xsec_weight 
+    for variable in weight_variables:
+        total_weight = total_weight * events[variable]
+    return total_weight
+
+
+def calc_weights(weight_variables, sample, events, lumi, variations):
+    """
+    Nominal and varied Monte Carlo event weights together, as an (n_events x 1 + n_variations) matrix
+    with the nominal weight in column 0. Each variation maps some of `weight_variables` to replacement
+    per-event values; the factors it leaves alone are shared with the nominal weight.
+    """
+    factors = {variable: np.asarray(events[variable], dtype=np.float64) for variable in weight_variables}
+    weights = np.empty((len(events), 1 + len(variations)))
+    weights[:, 0] = calc_weight(weight_variables, sample, factors, lumi)
+    for column, replacements in enumerate(variations, start=1):
+        varied = dict(factors, **{variable: np.asarray(values, dtype=np.float64)
+                                  for variable, values in replacements.items()})
+        weights[:, column] = calc_weight(weight_variables, sample, varied, lumi)
+    return weights
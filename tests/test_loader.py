@@ -0,0 +1,66 @@
+"""
+The RabbitMQ loader publishes exactly the chunks its manifest announced.
+"""
+import collections
+import json
+
+from hzz import chunking, serialization
+from hzz.backends.rabbitmq import QUEUE_NAME, RESULTS_QUEUE
+from hzz.services import loader
+
+
+class Channel:
+    """
+    Stands in for the ConfirmPublisher, keeping the decoded messages published to each queue.
+    """
+
+    def __init__(self):
+        self.queues = collections.defaultdict(list)
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        body = serialization.decompress(body, properties.content_encoding or 'identity')
+        self.queues[routing_key].append(serialization.loads(body))
+
+    def queue_depth(self, queue):
+        return len(self.queues[queue])
+
+    def close(self):
+        pass
+
+
+def test_fifo_publishes_the_manifest_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunking, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(loader, 'SCHEDULE', 'fifo')
+    monkeypatch.setattr(loader, 'CHUNK_PAYLOAD', 'ranges')
+    monkeypatch.setattr(loader, 'samples', {'data': {'list': ['data_A', 'data_B']}})
+
+    def chunk_ranges(sample):
+        # Sized from the measured costs, like hzz.loader.chunk_ranges: measured files get smaller chunks
+        costs = chunking.load_costs()
+        for val in loader.samples[sample]['list']:
+            step = 1000 if val in costs else 5000
+            for idx, entry_start in enumerate(range(0, 10000, step)):
+                yield val, idx, f"{val}.root", entry_start, entry_start + step
+    monkeypatch.setattr(loader, 'chunk_ranges', chunk_ranges)
+
+    publish_manifest = loader.publish_manifest
+
+    def publish_manifest_then_measure(*args):
+        publish_manifest(*args)
+        # A worker of an earlier run reports its cost while this run is being published
+        with open(tmp_path / "worker-host-1.jsonl", "w") as f:
+            f.write(json.dumps({'service': 'worker', 'val': 'data_A', 'events_in': 1000, 'elapsed': 1.0,
+                                'stages': {}}) + "\n")
+    monkeypatch.setattr(loader, 'publish_manifest', publish_manifest_then_measure)
+
+    channel = Channel()
+    monkeypatch.setattr(loader, 'connect_publisher', lambda queues: channel)
+    monkeypatch.setattr(loader.profiling, 'start', lambda service: None)
+    loader.main()
+
+    def identities(messages):
+        return [(m['val'], m['idx'], m['entry_start'], m['entry_stop']) for m in messages if 'val' in m]
+
+    manifest, = channel.queues[RESULTS_QUEUE]
+    assert identities(channel.queues[QUEUE_NAME]) == identities(manifest['manifest'])
+    assert len(manifest['manifest']) == 4